@@ -0,0 +1,230 @@
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+MIN_MATCH_RATIO = 0.7
+
+NGRAM_SIZE = 3
+MAX_POSTINGS = 64  # n-grams more common than this are too ambiguous to anchor on
+MAX_CANDIDATES = 8
+SLACK = 4  # window starts either side of each candidate that get verified
+MAX_BATCH_VERIFY = 256  # SequenceMatcher calls per segment in align_batch
+LOCAL_PADDING_MS = 120_000  # how far around a clip's previous segments align_local looks
+
+_punctuation = re.compile(r"[^\w]+")
+
+
+def normalize_token(text):
+    """Lowercase a word and strip punctuation ("Ago," -> "ago")."""
+    return _punctuation.sub("", text.lower())
+
+
+def normalize_text(text):
+    """Split text into normalized tokens, dropping punctuation-only tokens."""
+    tokens = (normalize_token(t) for t in text.split())
+    return [t for t in tokens if t]
+
+
+class TranscriptAligner:
+    """Normalized token array plus n-gram index over a TranscriptStore's words.
+
+    Built once per transcript. Each lookup votes for window starts using the
+    n-grams it shares with the transcript and runs SequenceMatcher only around
+    the best-voted starts, instead of at every position.
+    """
+
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.starts = transcript.starts
+        self.ends = transcript.ends
+
+        # Normalize the token table once, then map every word through it.
+        self.vocab = {}
+        table = np.array(
+            [self.vocab.setdefault(t, len(self.vocab)) if t else -1
+             for t in map(normalize_token, transcript.tokens)],
+            dtype=np.int32,
+        )
+        word_ids = table[transcript.word_ids] if len(table) else np.zeros(0, dtype=np.int32)
+        self.positions = np.flatnonzero(word_ids >= 0)  # token index -> word index
+        self.ids = word_ids[self.positions]
+        vocab = list(self.vocab)
+        self.tokens = [vocab[i] for i in self.ids.tolist()]
+
+        self.unigrams = defaultdict(list)
+        self.ngrams = defaultdict(list)
+        for i, token in enumerate(self.tokens):
+            self.unigrams[token].append(i)
+        for i in range(len(self.tokens) - NGRAM_SIZE + 1):
+            self.ngrams[tuple(self.tokens[i : i + NGRAM_SIZE])].append(i)
+
+    def _vote(self, segment_tokens, index, n, max_postings=MAX_POSTINGS):
+        votes = Counter()
+        for j in range(len(segment_tokens) - n + 1):
+            key = tuple(segment_tokens[j : j + n]) if n > 1 else segment_tokens[j]
+            postings = index.get(key, ())
+            if len(postings) > max_postings:
+                continue
+            for p in postings:
+                votes[p - j] += 1
+        return votes
+
+    def candidate_starts(self, segment_tokens):
+        """Window starts worth verifying for a normalized segment."""
+        window_size = len(segment_tokens)
+        if window_size < NGRAM_SIZE:
+            # Too short to anchor on n-grams; every occurrence of each word votes.
+            votes = self._vote(segment_tokens, self.unigrams, 1, max_postings=len(self.tokens))
+        else:
+            votes = self._vote(segment_tokens, self.ngrams, NGRAM_SIZE)
+            if not votes:
+                votes = self._vote(segment_tokens, self.unigrams, 1)
+
+        last_start = len(self.tokens) - window_size
+        starts = set()
+        for anchor, _ in votes.most_common(MAX_CANDIDATES):
+            for start in range(anchor - SLACK, anchor + SLACK + 1):
+                if 0 <= start <= last_start:
+                    starts.add(start)
+        return sorted(starts)
+
+    def find(self, segment_transcript):
+        """Return (start_ms, end_ms, ratio) of the best-matching window.
+
+        start_ms and end_ms are None when nothing could be compared.
+        """
+        segment_tokens = normalize_text(segment_transcript)
+        window_size = len(segment_tokens)
+        if not segment_tokens or window_size > len(self.tokens):
+            return None, None, 0
+
+        best_ratio, best_start = 0, None
+        for start in self.candidate_starts(segment_tokens):
+            window = self.tokens[start : start + window_size]
+            ratio = SequenceMatcher(None, segment_tokens, window).ratio()
+            if ratio > best_ratio:
+                best_ratio = ratio
+                best_start = start
+
+        if best_start is None:
+            return None, None, 0
+        return self.window_to_ms(best_start, window_size) + (best_ratio,)
+
+    def align_batch(self, segment_transcripts):
+        """Align many segments at once, returning (start_ms, end_ms, ratio) for each.
+
+        Windows are scored with a vectorized bag-of-words count: the number of
+        window tokens that occur anywhere in the segment bounds the
+        SequenceMatcher ratio from above, so windows that cannot reach
+        MIN_MATCH_RATIO are never compared, and the rest are verified best
+        bound first until no remaining window can beat the best ratio found.
+        """
+        in_segment = np.zeros(len(self.vocab) + 1, dtype=bool)
+        results = []
+        for segment_transcript in segment_transcripts:
+            segment_tokens = normalize_text(segment_transcript)
+            window_size = len(segment_tokens)
+            if not segment_tokens or window_size > len(self.tokens):
+                results.append((None, None, 0))
+                continue
+
+            segment_ids = [self.vocab[t] for t in segment_tokens if t in self.vocab]
+            in_segment[segment_ids] = True
+            hits = np.concatenate(([0], np.cumsum(in_segment[self.ids], dtype=np.int32)))
+            in_segment[segment_ids] = False
+
+            bounds = (hits[window_size:] - hits[:-window_size]) / window_size
+            starts = np.flatnonzero(bounds >= MIN_MATCH_RATIO)
+            if len(starts) == 0:
+                # Can't pass the threshold; still report how close it came.
+                results.append(self.find(segment_transcript))
+                continue
+            starts = starts[np.argsort(-bounds[starts], kind="stable")][:MAX_BATCH_VERIFY]
+
+            best_ratio, best_start = 0, None
+            for start in starts.tolist():
+                if bounds[start] < best_ratio:
+                    break
+                window = self.tokens[start : start + window_size]
+                ratio = SequenceMatcher(None, segment_tokens, window).ratio()
+                if best_start is None or ratio > best_ratio or (
+                    ratio == best_ratio and start < best_start
+                ):
+                    best_ratio = ratio
+                    best_start = start
+
+            results.append(self.window_to_ms(best_start, window_size) + (best_ratio,))
+        return results
+
+    def window_to_ms(self, start, window_size):
+        """Convert a token window to (start_ms, end_ms) of the original words."""
+        first = self.positions[start]
+        last = self.positions[start + window_size - 1]
+        return int(self.starts[first]), int(self.ends[last])
+
+
+def _merge_ranges(ranges, padding_ms):
+    merged = []
+    for start_ms, end_ms in sorted((s - padding_ms, e + padding_ms) for s, e in ranges):
+        if merged and start_ms <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end_ms)
+        else:
+            merged.append([start_ms, end_ms])
+    return merged
+
+
+def align_local(transcript, segment_transcript, ranges, padding_ms=LOCAL_PADDING_MS):
+    """Return (start_ms, end_ms, ratio) of the best match within padding_ms of any of ranges.
+
+    Only the words in those stretches are normalized and compared, so unlike
+    TranscriptAligner this costs the same on a 10-minute or a 3-hour episode.
+    Windows are pruned with the same bag-of-words bound as align_batch.
+    """
+    segment_tokens = normalize_text(segment_transcript)
+    window_size = len(segment_tokens)
+    if not segment_tokens:
+        return None, None, 0
+    segment_set = set(segment_tokens)
+    token_table = transcript.tokens
+
+    best = (None, None, 0)
+    for start_ms, end_ms in _merge_ranges(ranges, padding_ms):
+        first = int(np.searchsorted(transcript.starts, start_ms, side="left"))
+        last = int(np.searchsorted(transcript.starts, end_ms, side="right"))
+        positions, tokens = [], []
+        for i, word_id in enumerate(transcript.word_ids[first:last].tolist(), first):
+            token = normalize_token(token_table[word_id])
+            if token:
+                positions.append(i)
+                tokens.append(token)
+        if len(tokens) < window_size:
+            continue
+
+        hits = np.concatenate(([0], np.cumsum([t in segment_set for t in tokens], dtype=np.int32)))
+        bounds = (hits[window_size:] - hits[:-window_size]) / window_size
+        for start in np.argsort(-bounds, kind="stable")[:MAX_BATCH_VERIFY].tolist():
+            if bounds[start] < max(best[2], MIN_MATCH_RATIO):
+                break
+            ratio = SequenceMatcher(None, segment_tokens, tokens[start : start + window_size]).ratio()
+            if ratio > best[2]:
+                best = (
+                    int(transcript.starts[positions[start]]),
+                    int(transcript.ends[positions[start + window_size - 1]]),
+                    ratio,
+                )
+    return best
+
+
+_aligner_cache = {}
+
+
+def get_aligner(transcript):
+    """Return the aligner for a TranscriptStore, building it on first use."""
+    aligner = _aligner_cache.get(id(transcript))
+    if aligner is None or aligner.transcript is not transcript:
+        aligner = TranscriptAligner(transcript)
+        _aligner_cache.clear()
+        _aligner_cache[id(transcript)] = aligner
+    return aligner
@@ -0,0 +1,81 @@
+import fnmatch
+import json
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DEFAULT_PARALLEL_EPISODES = 2
+
+
+def list_episodes(episodes_dir=Path("episodes")):
+    """Names of every episode directory."""
+    if not episodes_dir.exists():
+        return []
+    return sorted(p.name for p in episodes_dir.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+
+def resolve_episodes(patterns, all_episodes=False, episodes_dir=Path("episodes")):
+    """Expand episode names and glob patterns (e.g. 'karpathy*'), keeping order and dropping duplicates."""
+    available = list_episodes(episodes_dir)
+    if all_episodes:
+        return available
+
+    names = []
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            matches = fnmatch.filter(available, pattern)
+            if not matches:
+                print(f"WARNING: No episodes match {pattern!r}")
+        else:
+            matches = [pattern]
+        names += [name for name in matches if name not in names]
+    return names
+
+
+def run_batch(episode_names, run_episode, parallel=DEFAULT_PARALLEL_EPISODES):
+    """Run run_episode(name) for every episode, `parallel` at a time.
+
+    run_episode returns (clips, failed_clips). An exception only fails its
+    own episode. Returns one result dict per episode, in input order.
+    """
+    def run(name):
+        print(f"=== {name}: starting")
+        start = time.perf_counter()
+        result = {"episode": name, "status": "ok", "clips": 0, "failed_clips": 0, "error": None}
+        try:
+            result["clips"], result["failed_clips"] = run_episode(name)
+            if result["failed_clips"]:
+                result["status"] = "partial"
+        except Exception as e:
+            traceback.print_exc()
+            stderr = getattr(e, "stderr", None)
+            result["status"] = "failed"
+            result["error"] = stderr.decode(errors="replace").strip() if stderr else str(e) or type(e).__name__
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"=== {name}: {result['status']} in {result['seconds']:.1f}s")
+        return result
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        return list(pool.map(run, episode_names))
+
+
+def format_report(results):
+    """Plain-text summary table of a batch run."""
+    width = max([len("episode")] + [len(r["episode"]) for r in results])
+    lines = [f"{'episode':<{width}}  {'status':<8} {'time':>8}  clips  failed"]
+    for r in results:
+        lines.append(
+            f"{r['episode']:<{width}}  {r['status']:<8} {r['seconds']:>7.1f}s  "
+            f"{r['clips']:>5}  {r['failed_clips']:>6}"
+        )
+        if r["error"]:
+            lines.append(f"  error: {r['error'].splitlines()[-1]}")
+    failed = sum(1 for r in results if r["status"] != "ok")
+    lines.append(f"{len(results) - failed} of {len(results)} episodes succeeded")
+    return "\n".join(lines)
+
+
+def save_report(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"episodes": results}, f, indent=2, ensure_ascii=False)
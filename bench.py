@@ -0,0 +1,803 @@
+import argparse
+import http.client
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+import ffmpeg
+import numpy as np
+
+import llm
+import main as pipeline
+from align import TranscriptAligner
+from catalog import Catalog, save_json, update_json
+from envelope import Envelope, build_envelope
+from export import EXPORT_FORMATS, export_clip
+from render import render_clip, render_clips
+from transcript_store import TranscriptStore
+
+VOCABULARY_SIZE = 5000
+PUNCTUATION = ["", "", "", "", ",", ".", "?"]
+
+
+def legacy_segment_transcript_to_timestamps(segment_transcript, transcript_data):
+    """The original sliding-window matcher, kept as the benchmark baseline."""
+    words = transcript_data["words"]
+    segment_words = segment_transcript.lower().split()
+    transcript_words = [w["text"].lower() for w in words]
+
+    best_ratio, best_start = 0, 0
+    window_size = len(segment_words)
+
+    for i in range(len(transcript_words) - window_size + 1):
+        window = transcript_words[i : i + window_size]
+        ratio = SequenceMatcher(None, segment_words, window).ratio()
+        if ratio > best_ratio:
+            best_ratio = ratio
+            best_start = i
+
+    if best_ratio < 0.7:
+        return None, None
+
+    start_ms = words[best_start]["start"]
+    end_ms = words[best_start + window_size - 1]["end"]
+
+    return start_ms, end_ms
+
+
+def make_transcript(num_words, seed=0):
+    """Build an AssemblyAI-shaped transcript with Zipf-distributed words."""
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(VOCABULARY_SIZE)]
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    texts = rng.choices(vocabulary, weights=weights, k=num_words)
+
+    words, utterances = [], []
+    t = 0
+    speaker = "A"
+    utterance_words = []
+    for i, text in enumerate(texts):
+        duration = rng.randint(120, 480)
+        if rng.random() < 0.1:
+            text = text.capitalize()
+        word = {
+            "text": text + rng.choice(PUNCTUATION),
+            "start": t,
+            "end": t + duration,
+            "confidence": round(rng.uniform(0.6, 1.0), 4),
+            "speaker": speaker,
+        }
+        words.append(word)
+        utterance_words.append(word)
+        t += duration + rng.randint(0, 200)
+
+        if rng.random() < 0.01 or i == num_words - 1:
+            utterances.append({
+                "speaker": speaker,
+                "start": utterance_words[0]["start"],
+                "end": utterance_words[-1]["end"],
+                "text": " ".join(w["text"] for w in utterance_words),
+                "confidence": 0.9,
+                "words": utterance_words,
+            })
+            utterance_words = []
+            speaker = "B" if speaker == "A" else "A"
+
+    return {
+        "text": " ".join(w["text"] for w in words),
+        "words": words,
+        "utterances": utterances,
+    }
+
+
+def make_segments(transcript_data, count, length, seed=0):
+    """Pick segments from the transcript and perturb them like an LLM quote would."""
+    rng = random.Random(seed)
+    words = transcript_data["words"]
+    segments = []
+    for _ in range(count):
+        start = rng.randrange(len(words) - length)
+        texts = [w["text"] for w in words[start : start + length]]
+        for _ in range(max(1, length // 30)):
+            texts.pop(rng.randrange(len(texts)))
+        texts = [t.rstrip(",.?") + rng.choice(PUNCTUATION) for t in texts]
+        segments.append(" ".join(texts))
+    return segments
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_align(args):
+    results = []
+    legacy_estimate = None
+    print(
+        f"{'words':>8} {'legacy/seg':>12} {'build':>9} {'indexed/seg':>12} "
+        f"{'batch/seg':>10} {'speedup':>9} {'realign/seg':>12}"
+    )
+    for num_words in args.sizes:
+        transcript_data = make_transcript(num_words, seed=num_words)
+        segments = make_segments(transcript_data, args.segments, args.segment_words, seed=num_words)
+
+        transcript = TranscriptStore.from_transcript_data(transcript_data)
+        aligner, build_time = timed(TranscriptAligner, transcript)
+        indexed = []
+        indexed_time = 0
+        for segment in segments:
+            result, elapsed = timed(aligner.find, segment)
+            indexed.append(result)
+            indexed_time += elapsed
+        indexed_per_segment = indexed_time / len(segments)
+        _, batch_time = timed(aligner.align_batch, segments)
+        batch_per_segment = batch_time / len(segments)
+        # The pipeline entry point, including the per-transcript aligner cache.
+        pipeline_time = sum(
+            timed(pipeline.segment_transcript_to_timestamps, segment, transcript)[1]
+            for segment in segments
+        )
+
+        # Iterating on a clip: trim each segment and re-align it near where it
+        # was, on a freshly opened transcript with no aligner built.
+        trimmed = [" ".join(segment.split()[len(segment.split()) // 3 :]) for segment in segments]
+        previous = [
+            {"start_ms": start_ms, "end_ms": end_ms, "duration_ms": end_ms - start_ms}
+            for start_ms, end_ms, _ in indexed if start_ms is not None
+        ]
+        fresh = TranscriptStore.from_transcript_data(transcript_data)
+        _, realign_time = timed(pipeline.realign_segments, trimmed, segments, previous, fresh)
+        realign_per_segment = realign_time / len(segments)
+
+        if num_words <= args.legacy_max_words or legacy_estimate is None:
+            legacy_time = 0
+            for segment, (start_ms, _, _) in zip(segments, indexed):
+                legacy, elapsed = timed(
+                    legacy_segment_transcript_to_timestamps, segment, transcript_data
+                )
+                legacy_time += elapsed
+                if legacy[0] is not None and legacy[0] != start_ms:
+                    print(f"  mismatch: legacy {legacy[0]} vs indexed {start_ms}")
+            legacy_per_segment = legacy_time / len(segments)
+            legacy_label = f"{legacy_per_segment:11.3f}s"
+        else:
+            # Too slow to run in full; the legacy cost is linear in transcript length.
+            legacy_per_segment = legacy_estimate * num_words
+            legacy_label = f"~{legacy_per_segment:10.3f}s"
+        legacy_estimate = legacy_per_segment / num_words
+
+        speedup = legacy_per_segment / min(indexed_per_segment, batch_per_segment)
+        print(
+            f"{num_words:>8} {legacy_label} {build_time:8.3f}s "
+            f"{indexed_per_segment * 1000:10.2f}ms {batch_per_segment * 1000:8.2f}ms "
+            f"{speedup:8.0f}x {realign_per_segment * 1000:10.2f}ms"
+        )
+        results.append({
+            "words": num_words,
+            "legacy_per_segment_s": legacy_per_segment,
+            "legacy_extrapolated": legacy_label.startswith("~"),
+            "build_s": build_time,
+            "indexed_per_segment_s": indexed_per_segment,
+            "batch_per_segment_s": batch_per_segment,
+            "segment_transcript_to_timestamps_per_segment_s": pipeline_time / len(segments),
+            "realign_per_segment_s": realign_per_segment,
+        })
+    return results
+
+
+def make_video(path, duration_s, size="1280x720"):
+    """Encode a lavfi test pattern with a tone as a stand-in episode video."""
+    video = ffmpeg.input(f"testsrc2=size={size}:rate=30", f="lavfi", t=duration_s)
+    audio = ffmpeg.input("sine=frequency=440:sample_rate=48000", f="lavfi", t=duration_s)
+    (
+        ffmpeg.output(video, audio, str(path), vcodec="libx264", preset="ultrafast", acodec="aac")
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+
+
+def make_numbered_video(path, duration_s, rate=30):
+    """Encode flat frames whose colour spells out their frame number, read back by frame_numbers."""
+    video = ffmpeg.input(f"color=c=black:size=320x180:rate={rate}", f="lavfi", t=duration_s).filter(
+        "geq", lum="16+4*mod(N,50)", cb="16+4*mod(floor(N/50),50)", cr="128",
+    )
+    audio = ffmpeg.input("sine=frequency=440:sample_rate=48000", f="lavfi", t=duration_s)
+    (
+        ffmpeg.output(video, audio, str(path), vcodec="libx264", crf=10, pix_fmt="yuv420p", acodec="aac")
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+
+
+def frame_numbers(path):
+    """Source frame number of every frame of a clip cut from a make_numbered_video source."""
+    out, _ = (
+        ffmpeg.input(str(path))
+        .output("pipe:", format="rawvideo", pix_fmt="yuv444p", vf="scale=16:16")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    planes = np.frombuffer(out, np.uint8).reshape(-1, 3, 256).mean(axis=2)
+    return [int(round((y - 16) / 4)) + 50 * int(round((u - 16) / 4)) for y, u, _ in planes]
+
+
+def check_smart_cut(temp_dir, clips, segments, segment_seconds, duration_s=60, rate=30):
+    """Render smart-cut clips from a numbered source and compare every frame with the source's.
+
+    Catches dropped or repeated frames where an encoded head meets a copied run.
+    """
+    source_dir = temp_dir / "numbered"
+    source_dir.mkdir()
+    video_path = source_dir / "video.mp4"
+    make_numbered_video(video_path, duration_s, rate)
+    frames = 0
+    for i in range(clips):
+        timestamps = make_timestamps(duration_s, segments, segment_seconds, seed=100 + i)
+        output_path = source_dir / f"clip_{i}.mp4"
+        render_clip(video_path, timestamps, output_path, mode="smart")
+        expected = []
+        for ts in timestamps:
+            first = math.ceil(ts["start_ms"] * rate / 1000 - 1e-6)
+            expected += range(first, first + math.ceil(ts["duration_ms"] * rate / 1000 - 1e-6))
+        actual = frame_numbers(output_path)
+        assert len(actual) == len(expected), (output_path.name, len(actual), len(expected))
+        wrong = [(n, a, e) for n, (a, e) in enumerate(zip(actual, expected)) if a != e]
+        assert not wrong, (output_path.name, wrong[:5])
+        frames += len(actual)
+    return frames
+
+
+def make_timestamps(duration_s, num_segments, segment_s, seed=0):
+    rng = random.Random(seed)
+    timestamps = []
+    for _ in range(num_segments):
+        start_ms = rng.randrange(0, int((duration_s - segment_s) * 1000))
+        timestamps.append({
+            "start_ms": start_ms,
+            "end_ms": start_ms + segment_s * 1000,
+            "duration_ms": segment_s * 1000,
+        })
+    return timestamps
+
+
+def bench_render(args):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        video_path = temp_dir / "video.mp4"
+        print(f"Encoding {args.duration}s lavfi test video...")
+        make_video(video_path, args.duration)
+
+        clips = [
+            (make_timestamps(args.duration, args.segments, args.segment_seconds, seed=i),
+             temp_dir / f"clip_{i}.mp4")
+            for i in range(args.clips)
+        ]
+
+        results = {}
+        for mode, label in [
+            ("segments", "segments"), ("graph", "graph"),
+            ("cached", "cached, cold"), ("cached", "cached, warm"),
+            ("smart", "smart, with mezzanine"), ("smart", "smart"),
+        ]:
+            start = time.perf_counter()
+            for timestamps, output_path in clips:
+                render_clip(video_path, timestamps, output_path, mode=mode)
+            results[label] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_clips(video_path, clips)
+        results["graph, one invocation"] = time.perf_counter() - start
+
+        smart_frames = check_smart_cut(temp_dir, args.clips, args.segments, min(args.segment_seconds, 10))
+
+        print(f"{args.clips} clips x {args.segments} segments x {args.segment_seconds}s")
+        for mode, elapsed in results.items():
+            speedup = results["segments"] / elapsed
+            print(f"  {mode:<24} {elapsed:8.2f}s {speedup:6.2f}x")
+        print(f"  smart cut matches the source frame for frame ({smart_frames} frames checked)")
+        return {"seconds": results, "smart_frames_checked": smart_frames}
+
+
+def bench_export(args):
+    """Exporting clips to every format: one ffmpeg run per format vs one split graph per clip."""
+    formats = list(EXPORT_FORMATS)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        print(f"Encoding {args.duration}s lavfi test video...")
+        make_video(temp_dir / "video.mp4", args.duration)
+        clips = [
+            (f"clip_{i}", make_timestamps(args.duration, args.segments, args.segment_seconds, seed=i))
+            for i in range(args.clips)
+        ]
+
+        def export_all(episode_dir, per_format):
+            for hook, timestamps in clips:
+                if per_format:
+                    for format_name in formats:
+                        export_clip(episode_dir, hook, timestamps, [format_name])
+                else:
+                    export_clip(episode_dir, hook, timestamps, formats)
+
+        (temp_dir / "separate").mkdir()
+        os.link(temp_dir / "video.mp4", temp_dir / "separate" / "video.mp4")
+        results = {}
+        _, results["run per format"] = timed(export_all, temp_dir / "separate", True)
+        _, results["one split graph"] = timed(export_all, temp_dir, False)
+        _, results["up to date"] = timed(export_all, temp_dir, False)
+
+    print(f"{args.clips} clips x {args.segments} segments x {args.segment_seconds}s to {len(formats)} formats")
+    for label, elapsed in results.items():
+        print(f"  {label:<18} {elapsed:8.2f}s {results['run per format'] / elapsed:8.2f}x")
+    return {"formats": formats, "seconds": results}
+
+
+def bench_envelope(args):
+    """Building the audio envelope once, then snapping cuts and drawing waveforms from it."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        video_path = temp_dir / "video.mp4"
+        print(f"Encoding {args.duration}s lavfi test video...")
+        make_video(video_path, args.duration, size="320x180")
+
+        _, build_time = timed(build_envelope, video_path, temp_dir / "envelope")
+        envelope, open_time = timed(Envelope, temp_dir / "envelope")
+        timestamps = make_timestamps(args.duration, args.boundaries // 2, 10)
+        _, snap_time = timed(envelope.snap, timestamps)
+        _, peaks_time = timed(lambda: [envelope.peaks(ts["start_ms"], ts["end_ms"], 100) for ts in timestamps])
+
+    print(f"{args.duration}s of audio: build {build_time:.2f}s, open {open_time * 1000:.2f}ms")
+    print(f"  snap {len(timestamps) * 2} boundaries  {snap_time * 1000:8.2f}ms")
+    print(f"  peaks for {len(timestamps)} segments {peaks_time * 1000:8.2f}ms")
+    return {
+        "duration_s": args.duration,
+        "build_s": build_time,
+        "open_s": open_time,
+        "snap_s": snap_time,
+        "peaks_s": peaks_time,
+        "boundaries": len(timestamps) * 2,
+    }
+
+
+def bench_transcript(args):
+    """Loading a transcript: parsing transcript.json vs opening the memory-mapped store."""
+    results = []
+    print(f"{'words':>8} {'json load':>10} {'store build':>12} {'store open':>11} {'readable':>9}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        for num_words in args.sizes:
+            json_path = temp_dir / f"transcript_{num_words}.json"
+            store_dir = temp_dir / f"store_{num_words}"
+            pipeline.save_transcript_json(make_transcript(num_words, seed=num_words), str(json_path))
+
+            transcript_data, json_time = timed(pipeline.load_transcript_json, str(json_path))
+            start = time.perf_counter()
+            TranscriptStore.from_transcript_data(transcript_data).save(store_dir, json_path)
+            build_time = time.perf_counter() - start
+
+            def open_store():
+                store = TranscriptStore(store_dir)
+                store.starts[-1], store.tokens[-1]  # touch the arrays
+                return store
+
+            store, open_time = timed(open_store)
+            _, readable_time = timed(pipeline.get_readable_transcript, store)
+            print(
+                f"{num_words:>8} {json_time:9.3f}s {build_time:11.3f}s "
+                f"{open_time * 1000:9.2f}ms {readable_time:8.3f}s"
+            )
+            results.append({
+                "words": num_words,
+                "load_transcript_json_s": json_time,
+                "store_build_s": build_time,
+                "store_open_s": open_time,
+                "readable_transcript_s": readable_time,
+            })
+    return results
+
+
+def make_library(episodes_dir, num_episodes, clips_per_episode, seed=0):
+    """Write a fake episode library: clip metadata only, no video."""
+    rng = random.Random(seed)
+    for e in range(num_episodes):
+        clips_dir = episodes_dir / f"episode_{e:04d}" / "clips"
+        clips_dir.mkdir(parents=True)
+        for c in range(clips_per_episode):
+            hook = f"clip_{c:04d}"
+            timestamps = make_timestamps(3600, rng.randint(1, 4), rng.randint(5, 30), seed=e * 10_000 + c)
+            save_json(clips_dir / f"{hook}_metadata.json", {
+                "hook": hook,
+                "tweet_text": f"Tweet {c} for episode {e}",
+                "segment_transcripts": ["segment text"] * len(timestamps),
+                "timestamps": timestamps,
+                "status": rng.choice(["draft", "draft", "approved"]),
+            })
+
+
+@contextmanager
+def working_directory(path):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def bench_catalog(args):
+    """Episode/clip listings and review endpoints on a fake library."""
+    import review
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir, working_directory(temp_dir):
+        episodes_dir = Path("episodes")
+        make_library(episodes_dir, args.episodes, args.clips)
+        total_clips = args.episodes * args.clips
+        print(f"{args.episodes} episodes x {args.clips} clips = {total_clips} clips")
+
+        # The library's clips are metadata only, as after a preview-only run
+        (episodes_dir / "episode_0000" / "video.mp4").touch()
+        catalog = Catalog(episodes_dir)
+        results["catalog_build_s"] = timed(catalog.build)[1]
+        assert all(e["has_clips"] for e in catalog.episodes()), "preview-only clips not listed"
+        results["get_all_episodes_s"] = timed(catalog.episodes)[1]
+        results["get_all_clips_s"] = timed(catalog.clips, "episode_0000")[1]
+
+        review.catalog = Catalog(episodes_dir)
+        review.catalog.build()
+        client = review.app.test_client()
+        home = client.get("/").get_data(as_text=True)
+        assert "/episode/episode_0000/clips" in home and "No clips yet" not in home, "preview-only clips not linked"
+        for name, url in [
+            ("home", "/"),
+            ("clip_list", "/episode/episode_0000/clips"),
+            ("clip_view", "/episode/episode_0000/clip/clip_0000"),
+        ]:
+            times = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response = client.get(url)
+                times.append(time.perf_counter() - start)
+                assert response.status_code == 200, (url, response.status_code)
+            times.sort()
+            results[f"{name}_median_s"] = times[len(times) // 2]
+
+    for name, elapsed in results.items():
+        print(f"  {name:<24} {elapsed * 1000:9.2f}ms")
+    return results
+
+
+def mark_rendered_loop(paths, stop, counts_path):
+    """Keep updating clip metadata from another process, like a background render job."""
+    counts = {}
+    while not stop.is_set():
+        for path in paths:
+            update_json(path, lambda metadata: metadata.update(rendered=True))
+            counts[str(path)] = counts.get(str(path), 0) + 1
+    save_json(counts_path, counts)
+
+
+def bench_load(args):
+    """Parallel save/approve requests against a threaded review server on a fake library.
+
+    Another process updates the same metadata files throughout. Afterwards
+    every clip's version must equal the number of writes it got, so no
+    update was lost, and every file must still parse.
+    """
+    import review
+    from werkzeug.serving import make_server
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir, working_directory(temp_dir):
+        episodes_dir = Path("episodes")
+        make_library(episodes_dir, args.episodes, args.clips)
+        clips = [(f"episode_{e:04d}", f"clip_{c:04d}") for e in range(args.episodes) for c in range(args.clips)]
+        paths = [episodes_dir / episode / "clips" / f"{hook}_metadata.json" for episode, hook in clips]
+
+        review.catalog = Catalog(episodes_dir)
+        review.catalog.build()
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = make_server("127.0.0.1", 0, review.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def send(request):
+            (episode, hook), action, text = request
+            body = urlencode({"tweet_text": text}) if action == "save" else ""
+            connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+            start = time.perf_counter()
+            connection.request(
+                "POST", f"/episode/{episode}/clip/{hook}/{action}", body,
+                {"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            status = connection.getresponse().status
+            connection.close()
+            return status, time.perf_counter() - start
+
+        stop = multiprocessing.Event()
+        writer = multiprocessing.Process(target=mark_rendered_loop, args=(paths, stop, "writer_counts.json"))
+        writer.start()
+        rng = random.Random(0)
+        writes = {}
+        approved = set()
+        try:
+            for concurrency in args.concurrency:
+                requests = []
+                for i in range(args.requests):
+                    clip = rng.choice(clips)
+                    action = rng.choice(["save", "approve"])
+                    requests.append((clip, action, f"Edited tweet {i}"))
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    responses = list(pool.map(send, requests))
+                elapsed = time.perf_counter() - start
+
+                for (clip, action, _), (status, _) in zip(requests, responses):
+                    assert status == 302, (clip, action, status)
+                    writes[clip] = writes.get(clip, 0) + 1
+                    if action == "approve":
+                        approved.add(clip)
+                latencies = sorted(latency for _, latency in responses)
+                results[concurrency] = {
+                    "requests_per_s": len(requests) / elapsed,
+                    "p50_ms": latencies[len(latencies) // 2] * 1000,
+                    "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+                }
+        finally:
+            stop.set()
+            writer.join()
+            server.shutdown()
+
+        with open("writer_counts.json", "r", encoding="utf-8") as f:
+            writer_counts = json.load(f)
+        for clip, path in zip(clips, paths):
+            with open(path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            expected = writes.get(clip, 0) + writer_counts.get(str(path), 0)
+            assert metadata.get("version", 0) == expected, (path, metadata.get("version"), expected)
+            assert clip not in approved or metadata["status"] == "approved", path
+        leftovers = [p for p in episodes_dir.rglob("*.tmp")]
+        assert not leftovers, leftovers
+
+    print(f"{len(clips)} clips, {args.requests} requests per level, {sum(writer_counts.values())} background writes")
+    for concurrency, stats in results.items():
+        print(
+            f"  {concurrency:>3} concurrent  {stats['requests_per_s']:8.1f} req/s"
+            f"  p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms"
+        )
+    print("  no lost updates, every metadata file intact")
+    return {"clips": len(clips), "background_writes": sum(writer_counts.values()), "levels": results}
+
+
+class StubClaude:
+    """Offline stand-in for the Anthropic client that answers every request with one response."""
+
+    def __init__(self, text):
+        self.text = text
+        self.messages = self
+
+    def _message(self):
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=self.text)],
+            usage=SimpleNamespace(input_tokens=0, output_tokens=0),
+        )
+
+    def create(self, **request):
+        return self._message()
+
+    @contextmanager
+    def stream(self, **request):
+        yield SimpleNamespace(
+            text_stream=llm.replay_stream(self.text),
+            get_final_message=self._message,
+        )
+
+
+def make_suggestions(transcript_data, count, segments_per_clip, segment_words, seed=0):
+    """A clip suggestions response quoting the transcript."""
+    segments = make_segments(transcript_data, count * segments_per_clip, segment_words, seed=seed)
+    suggestions = [
+        {
+            "tweet_text": f"Benchmark clip {i}",
+            "segment_transcripts": segments[i * segments_per_clip : (i + 1) * segments_per_clip],
+            "hook": f"bench_clip_{i}",
+        }
+        for i in range(count)
+    ]
+    return json.dumps(suggestions, indent=2)
+
+
+def bench_pipeline(args):
+    """A full main.py run on a lavfi episode with stubbed Claude and transcription."""
+    with tempfile.TemporaryDirectory() as temp_dir, working_directory(temp_dir):
+        episode_dir = Path("episodes") / "bench"
+        episode_dir.mkdir(parents=True)
+        print(f"Encoding {args.duration}s lavfi test video...")
+        make_video(episode_dir / "video.mp4", args.duration, args.size)
+
+        # make_transcript averages ~0.4s per word.
+        transcript_data = make_transcript(max(100, int(args.duration * 2.5)), seed=args.duration)
+        last_ms = args.duration * 1000
+        transcript_data["words"] = [w for w in transcript_data["words"] if w["end"] <= last_ms]
+        pipeline.save_transcript_json(transcript_data, "reference_transcript.json")
+        llm.set_client(StubClaude(make_suggestions(
+            transcript_data, args.clips, args.segments, args.segment_words, seed=args.duration,
+        )))
+
+        argv = [
+            "main.py", "bench", "--transcriber", "replay:reference_transcript.json",
+            "--chunk-minutes", str(args.chunk_minutes), "--no-llm-cache",
+        ]
+        results = {}
+        # warm: new suggestions and clips, but the transcript and segments are
+        # cached; resumed: a rerun with every step already checkpointed
+        for label, extra_args, clear_clips in [
+            ("cold", [], True), ("warm", ["--force", "suggest"], True), ("resumed", [], False),
+        ]:
+            if clear_clips:
+                shutil.rmtree(episode_dir / "clips", ignore_errors=True)
+            old_argv, sys.argv = sys.argv, argv + extra_args
+            start = time.perf_counter()
+            try:
+                pipeline.main()
+            except SystemExit as e:
+                if e.code:
+                    raise
+            finally:
+                sys.argv = old_argv
+            results[f"{label}_s"] = time.perf_counter() - start
+            rendered = len(list((episode_dir / "clips").glob("bench_clip_*.mp4")))
+
+        results["clips_rendered"] = rendered
+        print(f"{args.duration}s video, {args.clips} clips x {args.segments} segments")
+        print(f"  transcribe + suggest + align + render: {results['cold_s']:.2f}s")
+        print(f"  again, transcript and segments cached: {results['warm_s']:.2f}s")
+        print(f"  rerun, every step checkpointed:        {results['resumed_s']:.2f}s")
+        return results
+
+
+def bench_suite(args):
+    """Every benchmark with defaults small enough to run on each commit."""
+    return {
+        "align": bench_align(argparse.Namespace(
+            sizes=[10_000, 50_000], segments=4, segment_words=150, legacy_max_words=10_000,
+        )),
+        "transcript": bench_transcript(argparse.Namespace(sizes=[10_000, 50_000])),
+        "envelope": bench_envelope(argparse.Namespace(duration=120, boundaries=1000)),
+        "catalog": bench_catalog(argparse.Namespace(episodes=50, clips=40, requests=20)),
+        "load": bench_load(argparse.Namespace(episodes=2, clips=10, requests=200, concurrency=[1, 16])),
+        "render": bench_render(argparse.Namespace(
+            duration=120, clips=2, segments=3, segment_seconds=5,
+        )),
+        "export": bench_export(argparse.Namespace(
+            duration=120, clips=1, segments=2, segment_seconds=3,
+        )),
+        "pipeline": bench_pipeline(argparse.Namespace(
+            duration=600, size="640x360", clips=3, segments=2, segment_words=60,
+            chunk_minutes=args.chunk_minutes,
+        )),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the clip pipeline")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results as JSON, for comparing commits")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    align_parser = subparsers.add_parser("align", help="Segment alignment")
+    align_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000],
+        help="Transcript lengths in words",
+    )
+    align_parser.add_argument("--segments", type=int, default=4, help="Segments per transcript")
+    align_parser.add_argument("--segment-words", type=int, default=150, help="Words per segment")
+    align_parser.add_argument(
+        "--legacy-max-words", type=int, default=10_000,
+        help="Largest transcript to run the legacy matcher on; larger sizes are extrapolated",
+    )
+    align_parser.set_defaults(func=bench_align)
+
+    render_parser = subparsers.add_parser("render", help="Clip rendering")
+    render_parser.add_argument("--duration", type=int, default=600, help="Source video length in seconds")
+    render_parser.add_argument("--clips", type=int, default=4, help="Clips to render")
+    render_parser.add_argument("--segments", type=int, default=4, help="Segments per clip")
+    render_parser.add_argument("--segment-seconds", type=int, default=10, help="Seconds per segment")
+    render_parser.set_defaults(func=bench_render)
+
+    export_parser = subparsers.add_parser("export", help="Multi-format export of approved clips")
+    export_parser.add_argument("--duration", type=int, default=600, help="Source video length in seconds")
+    export_parser.add_argument("--clips", type=int, default=2, help="Clips to export")
+    export_parser.add_argument("--segments", type=int, default=3, help="Segments per clip")
+    export_parser.add_argument("--segment-seconds", type=int, default=5, help="Seconds per segment")
+    export_parser.set_defaults(func=bench_export)
+
+    transcript_parser = subparsers.add_parser("transcript", help="Transcript loading")
+    transcript_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000],
+        help="Transcript lengths in words",
+    )
+    transcript_parser.set_defaults(func=bench_transcript)
+
+    envelope_parser = subparsers.add_parser("envelope", help="Audio envelope build, cut snapping and waveforms")
+    envelope_parser.add_argument("--duration", type=int, default=3600, help="Source video length in seconds")
+    envelope_parser.add_argument("--boundaries", type=int, default=10_000, help="Segment boundaries to snap")
+    envelope_parser.set_defaults(func=bench_envelope)
+
+    catalog_parser = subparsers.add_parser("catalog", help="Episode/clip listings and review pages")
+    catalog_parser.add_argument("--episodes", type=int, default=100, help="Episodes in the fake library")
+    catalog_parser.add_argument("--clips", type=int, default=50, help="Clips per episode")
+    catalog_parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+    catalog_parser.set_defaults(func=bench_catalog)
+
+    load_parser = subparsers.add_parser("load", help="Concurrent save/approve requests against the review server")
+    load_parser.add_argument("--episodes", type=int, default=5, help="Episodes in the fake library")
+    load_parser.add_argument("--clips", type=int, default=20, help="Clips per episode")
+    load_parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level")
+    load_parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64], help="Requests in flight at once",
+    )
+    load_parser.set_defaults(func=bench_load)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Full main.py run, offline")
+    pipeline_parser.add_argument(
+        "--duration", type=int, default=600,
+        help="Episode length in seconds (600 to 10800 for 10 min to 3 h)",
+    )
+    pipeline_parser.add_argument("--size", default="640x360", help="Test video frame size")
+    pipeline_parser.add_argument("--clips", type=int, default=5, help="Clips suggested")
+    pipeline_parser.add_argument("--segments", type=int, default=3, help="Segments per clip")
+    pipeline_parser.add_argument("--segment-words", type=int, default=60, help="Words per segment")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    suite_parser = subparsers.add_parser("suite", help="All benchmarks with small defaults")
+    suite_parser.set_defaults(func=bench_suite)
+
+    for subparser in [pipeline_parser, suite_parser]:
+        subparser.add_argument(
+            "--chunk-minutes", type=float, default=pipeline.DEFAULT_CHUNK_SECONDS / 60,
+            help="Transcription chunk length passed to main.py (0 skips probing the video)",
+        )
+
+    args = parser.parse_args()
+    results = args.func(args)
+
+    if args.json:
+        report = {
+            "benchmark": args.benchmark,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.time(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("func", "json")},
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+METADATA_SUFFIX = "_metadata.json"
+
+
+def save_json(path, data):
+    """Write JSON atomically.
+
+    The file is written next to its destination and renamed into place, so
+    readers never see a partial file and the directory's mtime changes,
+    which is what the Catalog watches.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# Lock files open in this process. A child forked while one is held (a
+# render pool worker) would keep the lock alive after the parent releases it,
+# so children close their copies.
+_open_locks = set()
+os.register_at_fork(after_in_child=lambda: [lock.close() for lock in list(_open_locks)])
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path, shared with other threads and processes.
+
+    The lock is taken on a hidden .lock file next to path, which is never
+    deleted, so every writer always locks the same file.
+    """
+    path = Path(path)
+    with open(path.with_name(f".{path.name}.lock"), "a") as lock:
+        _open_locks.add(lock)
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+        finally:
+            _open_locks.discard(lock)
+
+
+def update_json(path, update, expected_version=None):
+    """Read-modify-write a JSON file under its lock, bumping its "version".
+
+    update(data) changes data in place; data is {} if the file doesn't exist
+    yet. With expected_version, nothing is written if the file's version has
+    moved on since the caller read it, and None is returned. Otherwise
+    returns the saved data.
+    """
+    path = Path(path)
+    with file_lock(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        version = data.get("version", 0)
+        if expected_version is not None and version != expected_version:
+            return None
+        update(data)
+        data["version"] = version + 1
+        save_json(path, data)
+        return data
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def clip_summary(hook, metadata):
+    """The fields the review UI lists for a clip."""
+    return {
+        "hook": hook,
+        "status": metadata.get("status", "draft"),
+        "duration": sum(t["duration_ms"] for t in metadata["timestamps"]) / 1000,
+        "num_segments": len(metadata["segment_transcripts"]),
+    }
+
+
+class Catalog:
+    """In-memory index of episodes and clip summaries for the review UI.
+
+    An episode is rescanned only when the mtime of its directory or its
+    clips directory changes (metadata is written with save_json, so every
+    write renames a file into the clips directory), and within a rescan only
+    metadata files whose own mtime changed are parsed again. Requests
+    therefore cost a couple of stat calls per episode instead of reading
+    every metadata file.
+    """
+
+    def __init__(self, episodes_dir="episodes"):
+        self.episodes_dir = Path(episodes_dir)
+        self._lock = threading.RLock()
+        self._listing_mtime = None
+        self._names = []
+        self._episodes = {}
+
+    def build(self):
+        """Index every episode, reusing whatever is already up to date."""
+        for name in self._episode_names():
+            self._refresh(name)
+
+    def episodes(self):
+        """Summaries of every episode, in name order."""
+        summaries = []
+        for name in self._episode_names():
+            entry = self._refresh(name)
+            clips = entry["clips"].values()
+            summaries.append({
+                "name": name,
+                "has_video": entry["has_video"],
+                "has_transcript": entry["has_transcript"],
+                "has_clips": entry["has_clips"],
+                "clip_count": len(entry["clips"]),
+                "draft_count": sum(1 for c in clips if c["summary"]["status"] == "draft"),
+                "approved_count": sum(1 for c in clips if c["summary"]["status"] == "approved"),
+            })
+        return summaries
+
+    def clips(self, episode_name):
+        """Summaries of an episode's clips, in metadata file name order."""
+        entry = self._refresh(episode_name)
+        return [entry["clips"][hook]["summary"] for hook in entry["order"]]
+
+    def update_clip(self, episode_name, hook, metadata):
+        """Record metadata the caller has just saved, without rescanning."""
+        with self._lock:
+            entry = self._refresh(episode_name)
+            path = self._clips_dir(episode_name) / f"{hook}{METADATA_SUFFIX}"
+            entry["clips"][hook] = {"mtime_ns": _mtime_ns(path), "summary": clip_summary(hook, metadata)}
+            if hook not in entry["order"]:
+                entry["order"] = sorted(entry["clips"], key=lambda h: h + METADATA_SUFFIX)
+            entry["mtimes"] = self._episode_mtimes(episode_name)
+
+    def invalidate(self, episode_name):
+        """Force the next lookup to rescan an episode, e.g. after a job wrote to it."""
+        with self._lock:
+            entry = self._episodes.get(episode_name)
+            if entry:
+                entry["mtimes"] = None
+
+    def _clips_dir(self, episode_name):
+        return self.episodes_dir / episode_name / "clips"
+
+    def _episode_names(self):
+        with self._lock:
+            mtime = _mtime_ns(self.episodes_dir)
+            if mtime is None:
+                self._names, self._listing_mtime = [], None
+            elif mtime != self._listing_mtime:
+                self._names = sorted(
+                    entry.name for entry in os.scandir(self.episodes_dir)
+                    if entry.is_dir() and not entry.name.startswith(".")
+                )
+                self._listing_mtime = mtime
+            return self._names
+
+    def _episode_mtimes(self, episode_name):
+        return (_mtime_ns(self.episodes_dir / episode_name), _mtime_ns(self._clips_dir(episode_name)))
+
+    def _refresh(self, episode_name):
+        with self._lock:
+            mtimes = self._episode_mtimes(episode_name)
+            entry = self._episodes.get(episode_name)
+            if entry and entry["mtimes"] == mtimes:
+                return entry
+
+            episode_dir = self.episodes_dir / episode_name
+            old_clips = entry["clips"] if entry else {}
+            clips = {}
+            clips_dir = self._clips_dir(episode_name)
+            files = sorted(os.scandir(clips_dir), key=lambda e: e.name) if clips_dir.is_dir() else []
+            for file in files:
+                if not file.name.endswith(METADATA_SUFFIX) or file.name.startswith("."):
+                    continue
+                hook = file.name[: -len(METADATA_SUFFIX)]
+                mtime_ns = file.stat().st_mtime_ns
+                cached = old_clips.get(hook)
+                if cached and cached["mtime_ns"] == mtime_ns:
+                    clips[hook] = cached
+                    continue
+                try:
+                    with open(file.path, "r", encoding="utf-8") as f:
+                        metadata = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                clips[hook] = {"mtime_ns": mtime_ns, "summary": clip_summary(hook, metadata)}
+
+            entry = {
+                "mtimes": mtimes,
+                "has_video": (episode_dir / "video.mp4").exists(),
+                "has_transcript": (episode_dir / "transcript.json").exists(),
+                # Preview-only clips have metadata but no mp4 yet
+                "has_clips": bool(clips),
+                "clips": clips,
+                "order": list(clips),
+            }
+            self._episodes[episode_name] = entry
+            return entry
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from catalog import file_lock, save_json
+
+CHECKPOINT_VERSION = 1
+STAGES = ["transcribe", "suggest", "align", "name", "render"]
+
+
+def checkpoint_key(*inputs):
+    """Hash of a step's inputs; the step's saved output is reused only while this matches."""
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+
+def clip_key(suggestion):
+    """Identify a clip by its suggestion, so an identical suggestion reuses its steps."""
+    return checkpoint_key(suggestion["tweet_text"], suggestion["segment_transcripts"])
+
+
+def file_state(path):
+    """(size, mtime) of a file, to notice it being replaced or deleted after it was recorded."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Checkpoint:
+    """Finished pipeline steps of one episode, persisted to episodes/<name>/checkpoint.json.
+
+    The suggestions are saved as they stream in; every clip's alignment,
+    hook and render are saved as each finishes, with a key over the step's
+    inputs. A rerun reuses every step whose key still matches, unless its
+    stage is in `force`. Every save rereads the file under its lock, so
+    clips finishing concurrently and jobs run from the review UI in other
+    processes don't overwrite each other's steps.
+    """
+
+    def __init__(self, path, force=()):
+        self.path = Path(path)
+        self.force = set(force)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        if not data or data.get("version") != CHECKPOINT_VERSION:
+            data = {"version": CHECKPOINT_VERSION, "transcript": None, "suggest": None, "clips": {}}
+        return data
+
+    def _write(self, change):
+        """Apply change(data) to the checkpoint as it is on disk and save it."""
+        with self._lock, file_lock(self.path):
+            self.data = self._load()
+            change(self.data)
+            save_json(self.path, self.data)
+
+    def set_transcript(self, fingerprint):
+        """Drop every saved step if the transcript they were computed from has changed."""
+        def change(data):
+            if data["transcript"] != fingerprint:
+                data.update(transcript=fingerprint, suggest=None, clips={})
+
+        self._write(change)
+
+    def suggestions(self, key):
+        """The complete list of suggestions saved under key, or None."""
+        saved = self.data["suggest"]
+        if "suggest" in self.force or not saved or saved["key"] != key or not saved["complete"]:
+            return None
+        return saved["suggestions"]
+
+    def record_suggestions(self, key, suggestions):
+        """Pass suggestions through, saving each one as it arrives."""
+        self._write(lambda data: data.update(suggest={"key": key, "complete": False, "suggestions": []}))
+        for suggestion in suggestions:
+            self._write(lambda data: data["suggest"]["suggestions"].append(suggestion))
+            yield suggestion
+        self._write(lambda data: data["suggest"].update(complete=True))
+
+    def get(self, clip, stage, key):
+        """A clip's saved output for stage, or None if it was saved for other inputs."""
+        with self._lock:
+            step = self.data["clips"].get(clip, {}).get(stage)
+        if stage in self.force or step is None or step["key"] != key:
+            return None
+        return step["value"]
+
+    def saved(self, clip, stage):
+        """A clip's saved output for stage whatever its inputs were, or None."""
+        with self._lock:
+            step = self.data["clips"].get(clip, {}).get(stage)
+        return None if step is None else step["value"]
+
+    def put(self, clip, stage, key, value):
+        self._write(lambda data: data["clips"].setdefault(clip, {}).update({stage: {"key": key, "value": value}}))
+
+    def finished(self):
+        """Whether the last run got through every suggested clip."""
+        saved = self.data["suggest"]
+        return bool(saved and saved["complete"]) and all(
+            "render" in self.data["clips"].get(clip_key(s), {}) for s in saved["suggestions"]
+        )
+
+    def find_clip(self, hook):
+        """The clip whose saved hook is `hook`, or None."""
+        with self._lock:
+            for clip, steps in self.data["clips"].items():
+                if steps.get("name", {}).get("value") == hook:
+                    return clip
+        return None
+
+    def update(self, clip, stage, value, key=None):
+        """Replace a saved output, keeping its key unless one is given.
+
+        Iterating on a clip uses this, so a rerun keeps the edited clip
+        rather than restoring the original suggestion's.
+        """
+        def change(data):
+            step = data["clips"].get(clip, {}).get(stage)
+            if step is not None:
+                step["value"] = value
+                if key is not None:
+                    step["key"] = key
+
+        self._write(change)
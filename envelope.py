@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import ffmpeg
+import numpy as np
+
+from catalog import file_lock
+
+ENVELOPE_VERSION = 1
+SAMPLE_RATE = 16000
+HOP_MS = 10
+HOP_SAMPLES = SAMPLE_RATE * HOP_MS // 1000
+READ_HOPS = 6000  # one minute of audio per read
+
+QUIET_PERCENTILE = 10  # frames quieter than QUIET_FACTOR x this percentile count as gaps
+QUIET_FACTOR = 2.0
+SNAP_BEFORE_MS = 300  # how far a segment start may move earlier to reach a gap
+SNAP_AFTER_MS = 300  # how far a segment end may move later to reach a gap
+SNAP_SLACK_MS = 40  # and how far either may move into the segment
+
+
+def envelope_dir(episode_dir):
+    return Path(episode_dir) / "envelope"
+
+
+def build_envelope(video_path, store_dir):
+    """Decode the audio once and write its RMS envelope (one value per 10 ms).
+
+    Writes rms.npy (float16), quiet.npy (sorted int32 indices of low-energy
+    frames, for searchsorted) and meta.json, replacing any previous copy.
+    """
+    process = (
+        ffmpeg.input(str(video_path))
+        .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=SAMPLE_RATE, vn=None)
+        .global_args("-loglevel", "error")
+        .run_async(pipe_stdout=True)
+    )
+    blocks = []
+    remainder = np.zeros(0, dtype=np.float32)
+    while True:
+        data = process.stdout.read(HOP_SAMPLES * READ_HOPS * 4)
+        if not data:
+            break
+        samples = np.concatenate([remainder, np.frombuffer(data, dtype=np.float32)])
+        usable = len(samples) - len(samples) % HOP_SAMPLES
+        frames = samples[:usable].reshape(-1, HOP_SAMPLES)
+        blocks.append(np.sqrt(np.mean(frames * frames, axis=1)))
+        remainder = samples[usable:]
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to decode audio from {video_path}")
+    if len(remainder):
+        blocks.append(np.sqrt(np.mean(remainder * remainder, keepdims=True)))
+
+    rms = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    threshold = QUIET_FACTOR * float(np.percentile(rms, QUIET_PERCENTILE)) if len(rms) else 0.0
+    quiet = np.flatnonzero(rms <= threshold).astype(np.int32)
+
+    store_dir = Path(store_dir)
+    store_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{store_dir.name}.", dir=store_dir.parent))
+    try:
+        _write_envelope(tmp_dir, video_path, rms, quiet, threshold)
+        # Swap under the lock, so two jobs building at once can't interleave
+        with file_lock(store_dir):
+            shutil.rmtree(store_dir, ignore_errors=True)
+            os.replace(tmp_dir, store_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _write_envelope(tmp_dir, video_path, rms, quiet, threshold):
+    np.save(tmp_dir / "rms.npy", rms.astype(np.float16))
+    np.save(tmp_dir / "quiet.npy", quiet)
+    stat = os.stat(video_path)
+    meta = {
+        "version": ENVELOPE_VERSION,
+        "hop_ms": HOP_MS,
+        "quiet_threshold": threshold,
+        "peak": float(rms.max()) if len(rms) else 0.0,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+    }
+    with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def is_stale(store_dir, video_path):
+    """Whether the envelope is missing or was computed from a different video."""
+    meta_path = Path(store_dir) / "meta.json"
+    if not meta_path.exists():
+        return True
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    stat = os.stat(video_path)
+    return (
+        meta.get("version") != ENVELOPE_VERSION
+        or meta.get("source_size") != stat.st_size
+        or meta.get("source_mtime_ns") != stat.st_mtime_ns
+    )
+
+
+class Envelope:
+    """Memory-mapped RMS envelope of an episode's audio."""
+
+    def __init__(self, store_dir):
+        store_dir = Path(store_dir)
+        with open(store_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.hop_ms = self.meta["hop_ms"]
+        self.rms = np.load(store_dir / "rms.npy", mmap_mode="r")
+        self.quiet = np.load(store_dir / "quiet.npy", mmap_mode="r")
+
+    def snap_start(self, ms):
+        """Move a segment start to the nearest gap at or just before it, if one is close."""
+        frame = ms // self.hop_ms
+        i = int(np.searchsorted(self.quiet, frame + SNAP_SLACK_MS // self.hop_ms, side="right")) - 1
+        if i >= 0 and frame - self.quiet[i] <= SNAP_BEFORE_MS // self.hop_ms:
+            return int(self.quiet[i]) * self.hop_ms
+        return ms
+
+    def snap_end(self, ms):
+        """Move a segment end to the nearest gap at or just after it, if one is close."""
+        frame = -(-ms // self.hop_ms)
+        i = int(np.searchsorted(self.quiet, frame - SNAP_SLACK_MS // self.hop_ms, side="left"))
+        if i < len(self.quiet) and self.quiet[i] - frame <= SNAP_AFTER_MS // self.hop_ms:
+            return (int(self.quiet[i]) + 1) * self.hop_ms
+        return ms
+
+    def snap(self, timestamps):
+        """Timestamps with every boundary snapped to a nearby low-energy gap."""
+        snapped = []
+        for ts in timestamps:
+            start_ms = self.snap_start(ts["start_ms"])
+            end_ms = max(start_ms + self.hop_ms, self.snap_end(ts["start_ms"] + ts["duration_ms"]))
+            snapped.append({**ts, "start_ms": start_ms, "end_ms": end_ms, "duration_ms": end_ms - start_ms})
+        return snapped
+
+    def peaks(self, start_ms, end_ms, points):
+        """Max RMS over `points` equal buckets of [start_ms, end_ms), scaled to 0-1."""
+        first = max(0, start_ms // self.hop_ms)
+        last = min(len(self.rms), max(first + 1, end_ms // self.hop_ms))
+        frames = np.asarray(self.rms[first:last], dtype=np.float32)
+        if not len(frames):
+            return [0.0] * points
+        bucket_starts = np.arange(points) * len(frames) // points
+        if len(frames) >= points:
+            values = np.maximum.reduceat(frames, bucket_starts)
+        else:
+            values = frames[bucket_starts]
+        peak = self.meta["peak"] or 1.0
+        return [round(float(v) / peak, 3) for v in values]
+
+
+def load_envelope(episode_dir):
+    """The episode's envelope, or None if it hasn't been computed."""
+    store_dir = envelope_dir(episode_dir)
+    if not (store_dir / "meta.json").exists():
+        return None
+    return Envelope(store_dir)
+
+
+def ensure_envelope(episode_dir):
+    """Compute the episode's envelope unless an up-to-date one exists."""
+    video_path = Path(episode_dir) / "video.mp4"
+    store_dir = envelope_dir(episode_dir)
+    if is_stale(store_dir, video_path):
+        print("Analyzing audio envelope")
+        build_envelope(video_path, store_dir)
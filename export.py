@@ -0,0 +1,219 @@
+import contextvars
+import fcntl
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import ffmpeg
+import numpy as np
+
+import tracing
+from render import AUDIO_CODEC, OUTPUT_FLAGS, VIDEO_CODEC, snap_to_gaps, source_fingerprint
+
+EXPORT_VERSION = 1
+DEFAULT_EXPORT_WORKERS = 2  # clips exported at once; each is one ffmpeg run over all its formats
+
+# Each format is center-cropped to its aspect ratio and scaled to its size
+EXPORT_FORMATS = {
+    "square": {
+        "width": 1080, "height": 1080,
+        "output": {"crf": 20, "audio_bitrate": "160k"},
+    },
+    "vertical": {
+        "width": 1080, "height": 1920,
+        "output": {"crf": 20, "audio_bitrate": "160k"},
+    },
+    "landscape": {
+        "width": 1920, "height": 1080,
+        "output": {"crf": 20, "audio_bitrate": "160k"},
+    },
+    "square_small": {
+        "width": 720, "height": 720,
+        "output": {"video_bitrate": "1500k", "maxrate": "2000k", "bufsize": "3000k", "audio_bitrate": "96k"},
+    },
+}
+
+CAPTION_MAX_WORDS = 4
+CAPTION_MAX_MS = 1800
+CAPTION_STYLE = "FontName=Arial,FontSize=16,Bold=1,Outline=2,Shadow=0,Alignment=2,MarginV=30"
+
+
+def export_dir(episode_dir, hook):
+    return Path(episode_dir) / "exports" / hook
+
+
+def target_name(format_name, captions):
+    return f"{format_name}_captioned" if captions else format_name
+
+
+def caption_cues(transcript, timestamps, snapped=None):
+    """Caption lines for a clip as (start_ms, end_ms, text), on the clip's own timeline.
+
+    Words are taken from each segment's range of the transcript and grouped
+    into lines of a few words, never spanning a segment join. snapped are
+    the segments as cut (see snap_to_gaps): words are still chosen by the
+    aligned range, so a start snapped into the first word keeps it, and
+    cue times are clamped to the cut.
+    """
+    cues = []
+    offset_ms = 0
+    for ts, cut in zip(timestamps, snapped or timestamps):
+        first = int(np.searchsorted(transcript.starts, ts["start_ms"], side="left"))
+        last = int(np.searchsorted(transcript.starts, ts["start_ms"] + ts["duration_ms"], side="left"))
+        start_ms = cut["start_ms"]
+        end_ms = start_ms + cut["duration_ms"]
+        line = []
+        for i in range(first, last):
+            word_start = min(max(int(transcript.starts[i]), start_ms), end_ms) - start_ms + offset_ms
+            word_end = min(max(int(transcript.ends[i]), start_ms), end_ms) - start_ms + offset_ms
+            if line and (len(line) == CAPTION_MAX_WORDS or word_end - line[0][0] > CAPTION_MAX_MS):
+                cues.append((line[0][0], line[-1][1], " ".join(w for _, _, w in line)))
+                line = []
+            line.append((word_start, word_end, transcript.text(i, i + 1)))
+        if line:
+            cues.append((line[0][0], line[-1][1], " ".join(w for _, _, w in line)))
+        offset_ms += cut["duration_ms"]
+    return cues
+
+
+def _srt_time(ms):
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def write_srt(cues, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for n, (start_ms, end_ms, text) in enumerate(cues, 1):
+            f.write(f"{n}\n{_srt_time(start_ms)} --> {_srt_time(end_ms)}\n{text}\n\n")
+
+
+def export_settings(video_path, timestamps, format_name, cues):
+    """Everything a target's output depends on; it is up to date while these match."""
+    return json.loads(json.dumps({
+        "version": EXPORT_VERSION,
+        "source": source_fingerprint(video_path),
+        "timestamps": timestamps,
+        "format": EXPORT_FORMATS[format_name],
+        "captions": cues,
+    }))
+
+
+def is_current(output_path, settings):
+    try:
+        with open(output_path.with_suffix(".json"), "r", encoding="utf-8") as f:
+            return json.load(f) == settings and output_path.exists()
+    except FileNotFoundError:
+        return False
+
+
+def export_outputs(video_path, timestamps, targets, srt_path=None):
+    """Build one ffmpeg run that decodes the clip's segments once and encodes every target.
+
+    targets is a list of (format name, output path). The joined segments are
+    split, then each branch is cropped, scaled and optionally captioned.
+    """
+    streams = []
+    for ts in timestamps:
+        segment = ffmpeg.input(str(video_path), ss=ts["start_ms"] / 1000, t=ts["duration_ms"] / 1000)
+        streams += [segment.video, segment.audio]
+    joined = ffmpeg.concat(*streams, v=1, a=1).node
+    videos = joined[0].split()
+    audios = joined[1].filter_multi_output("asplit")
+
+    outputs = []
+    for i, (format_name, output_path) in enumerate(targets):
+        spec = EXPORT_FORMATS[format_name]
+        width, height = spec["width"], spec["height"]
+        video = (
+            videos[i]
+            .filter("crop", f"min(iw,ih*{width}/{height})", f"min(ih,iw*{height}/{width})")
+            .filter("scale", width, height)
+            .filter("setsar", 1)
+        )
+        if srt_path:
+            video = video.filter("subtitles", str(srt_path), force_style=CAPTION_STYLE)
+        outputs.append(ffmpeg.output(
+            video, audios[i], str(output_path),
+            vcodec=VIDEO_CODEC, acodec=AUDIO_CODEC, pix_fmt="yuv420p", **spec["output"], **OUTPUT_FLAGS,
+        ))
+    return ffmpeg.merge_outputs(*outputs)
+
+
+def export_clip(episode_dir, hook, timestamps, formats, transcript=None):
+    """Export a clip to every format in one pass, skipping targets that are up to date.
+
+    With a transcript, captions are burned in from its word timestamps.
+    Returns the number of targets encoded.
+    """
+    video_path = Path(episode_dir) / "video.mp4"
+    snapped = snap_to_gaps(video_path, timestamps)
+    cues = caption_cues(transcript, timestamps, snapped) if transcript is not None else None
+    timestamps = snapped
+    out_dir = export_dir(episode_dir, hook)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(out_dir / ".lock", "w") as lock, tracing.span("export_clip", clip=hook) as attrs:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stale = []
+        for format_name in formats:
+            output_path = out_dir / f"{target_name(format_name, cues is not None)}.mp4"
+            settings = export_settings(video_path, timestamps, format_name, cues)
+            if not is_current(output_path, settings):
+                stale.append((format_name, output_path, settings))
+        attrs.update(targets=len(formats), encoded=len(stale))
+        if not stale:
+            return 0
+
+        # Captions are read from a temp dir, whose path needs no filter escaping
+        with tempfile.TemporaryDirectory() as tmp:
+            srt_path = None
+            if cues is not None:
+                srt_path = Path(tmp) / "captions.srt"
+                write_srt(cues, srt_path)
+            targets = [(name, path.with_name(f"{path.stem}.tmp{path.suffix}")) for name, path, _ in stale]
+            (
+                export_outputs(video_path, timestamps, targets, srt_path)
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+            for (_, output_path, settings), (_, temp_path) in zip(stale, targets):
+                os.replace(temp_path, output_path)
+                with open(output_path.with_suffix(".json"), "w", encoding="utf-8") as f:
+                    json.dump(settings, f, indent=2)
+    return len(stale)
+
+
+def approved_clips(episode_dir):
+    """(hook, timestamps) of every approved clip of an episode."""
+    clips = []
+    for metadata_path in sorted((Path(episode_dir) / "clips").glob("*_metadata.json")):
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("status") == "approved" and metadata.get("timestamps"):
+            clips.append((metadata_path.name[: -len("_metadata.json")], metadata["timestamps"]))
+    return clips
+
+
+def export_episode(episode_dir, formats, transcript=None, workers=DEFAULT_EXPORT_WORKERS):
+    """Export every approved clip of an episode, `workers` clips at a time. Returns (clips, failed)."""
+    clips = approved_clips(episode_dir)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run, export_clip, episode_dir, hook, timestamps, formats, transcript,
+            ): hook
+            for hook, timestamps in clips
+        }
+        for future in as_completed(futures):
+            hook = futures[future]
+            try:
+                encoded = future.result()
+            except Exception as e:
+                stderr = getattr(e, "stderr", None)
+                print(f"{hook}: export failed: {stderr.decode(errors='replace') if stderr else e}")
+                failed += 1
+                continue
+            print(f"{hook}: {f'exported {encoded} of {len(formats)} formats' if encoded else 'up to date'}")
+    return len(clips), failed
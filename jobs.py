@@ -0,0 +1,187 @@
+import itertools
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+from metrics import JOB_BUCKETS, Histogram
+
+ACTIVE = ("queued", "running", "cancelling")
+OUTPUT_LINES = 20  # tail of a job's output kept for the UI
+
+job_duration = Histogram(
+    "podcast_job_duration_seconds", "Run time of finished background jobs",
+    ("kind", "status"), JOB_BUCKETS,
+)
+
+
+class Job:
+    """A command run by the JobQueue, with its status and latest output line."""
+
+    def __init__(self, job_id, kind, key, command, description, on_done=None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.command = command
+        self.description = description
+        self.on_done = on_done
+        self.status = "queued"
+        self.progress = "Waiting to start"
+        self.output = deque(maxlen=OUTPUT_LINES)
+        self.returncode = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.process = None
+        self.version = 0  # bumped on every change, for event streams
+
+    @property
+    def active(self):
+        return self.status in ACTIVE
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "progress": self.progress,
+            "returncode": self.returncode,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "output": "\n".join(self.output),
+        }
+
+
+class JobQueue:
+    """In-process queue that runs jobs as subprocesses on a few worker threads.
+
+    Submitting a job whose key matches a queued or running job returns the
+    existing job instead of queueing a duplicate. Jobs can be cancelled
+    while queued or running.
+    """
+
+    def __init__(self, workers=2, keep_finished=200):
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._changed = threading.Condition()
+        self._threads = []
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind, key, command, description, on_done=None):
+        """Queue a command, or return the active job that already has this key."""
+        with self._changed:
+            for job in self.jobs.values():
+                if job.key == key and job.active:
+                    return job
+            job = Job(str(next(self._ids)), kind, key, command, description, on_done)
+            self.jobs[job.id] = job
+            self._prune()
+            self._start_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def active_job(self, key):
+        for job in self.jobs.values():
+            if job.key == key and job.active:
+                return job
+        return None
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or terminate a running one."""
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return job
+            if job.status == "queued":
+                self._finish(job, "cancelled", "Cancelled")
+            elif job.process:
+                job.status = "cancelling"
+                job.process.terminate()
+                self._touch(job)
+        return job
+
+    def wait_for_change(self, job, version, timeout=15):
+        """Block until job.version moves past version or timeout expires."""
+        with self._changed:
+            self._changed.wait_for(lambda: job.version != version, timeout=timeout)
+        return job.version
+
+    def _touch(self, job):
+        job.version += 1
+        self._changed.notify_all()
+
+    def _finish(self, job, status, progress):
+        job.status = status
+        job.progress = progress
+        job.finished_at = time.time()
+        if job.started_at is not None:
+            job_duration.observe(job.finished_at - job.started_at, kind=job.kind, status=status)
+        self._touch(job)
+
+    def _prune(self):
+        finished = [j for j in self.list() if not j.active]
+        for job in finished[self.keep_finished:]:
+            del self.jobs[job.id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._changed:
+                if job.status != "queued":
+                    continue
+                job.status = "running"
+                job.progress = "Starting"
+                job.started_at = time.time()
+                try:
+                    job.process = subprocess.Popen(
+                        job.command,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        text=True,
+                        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                    )
+                except OSError as e:
+                    self._finish(job, "failed", f"Could not start job: {e}")
+                    continue
+                self._touch(job)
+
+            for line in job.process.stdout:
+                line = line.rstrip()
+                if not line:
+                    continue
+                with self._changed:
+                    job.output.append(line)
+                    job.progress = line
+                    self._touch(job)
+
+            returncode = job.process.wait()
+            with self._changed:
+                job.returncode = returncode
+                if job.status == "cancelling":
+                    self._finish(job, "cancelled", "Cancelled")
+                elif returncode == 0:
+                    self._finish(job, "done", "Done")
+                else:
+                    self._finish(job, "failed", job.output[-1] if job.output else "Failed")
+                job.process = None
+
+            if job.on_done:
+                job.on_done(job)
@@ -0,0 +1,88 @@
+import bisect
+import json
+import math
+import os
+import subprocess
+from fractions import Fraction
+from pathlib import Path
+
+import ffmpeg
+
+from catalog import save_json
+
+KEYFRAME_INDEX_VERSION = 1
+EPSILON = 1e-6
+
+
+def probe_keyframes(video_path):
+    """Keyframe times (seconds) of the first video stream, from packet flags without decoding."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(video_path),
+        ],
+        capture_output=True, text=True, check=True,
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def probe_frame_rate(video_path):
+    stream = next(s for s in ffmpeg.probe(str(video_path))["streams"] if s["codec_type"] == "video")
+    return float(Fraction(stream["avg_frame_rate"]))
+
+
+def build_keyframe_index(video_path):
+    stat = os.stat(video_path)
+    return {
+        "version": KEYFRAME_INDEX_VERSION,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "frame_rate": probe_frame_rate(video_path),
+        "keyframes": probe_keyframes(video_path),
+    }
+
+
+def load_keyframe_index(video_path, index_path):
+    """The video's keyframe index, probed once and cached at index_path.
+
+    Reprobed whenever the video's size or mtime changes.
+    """
+    index_path = Path(index_path)
+    stat = os.stat(video_path)
+    if index_path.exists():
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if (
+            index.get("version") == KEYFRAME_INDEX_VERSION
+            and index.get("source_size") == stat.st_size
+            and index.get("source_mtime_ns") == stat.st_mtime_ns
+        ):
+            return index
+
+    index = build_keyframe_index(video_path)
+    save_json(index_path, index)
+    return index
+
+
+def plan_cut(index, start_s, duration_s):
+    """Split a segment into frames to encode and a run of frames to stream-copy.
+
+    Frames are picked the way ffmpeg's -ss/-t pick them: the first frame at or
+    after start_s and ceil(duration x fps) frames from there. Returns frame
+    numbers (first, split, end): frames [first, split) are encoded and
+    [split, end) are copied, split being the first keyframe in the segment.
+    split is None when the segment has no keyframe to copy from.
+    """
+    fps = index["frame_rate"]
+    first = math.ceil(start_s * fps - EPSILON)
+    end = first + max(1, math.ceil(duration_s * fps - EPSILON))
+    keyframes = index["keyframes"]
+    i = bisect.bisect_left(keyframes, (first - 0.5) / fps)
+    if i == len(keyframes) or keyframes[i] >= (end - 0.5) / fps:
+        return first, None, end
+    return first, round(keyframes[i] * fps), end
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import anthropic
+
+import tracing
+from retry import RETRY_ATTEMPTS, wait_before_retry, with_retries
+
+MODEL = "claude-sonnet-4-5"
+MAX_TOKENS = 16000
+THINKING_BUDGET = 1024
+DEFAULT_CONCURRENCY = 4
+
+CACHE_DIR = Path("episodes") / ".cache" / "llm"
+
+_client = None
+_lock = threading.Lock()
+_use_cache = True
+_slots = threading.BoundedSemaphore(DEFAULT_CONCURRENCY)
+
+stats = {
+    "calls": 0,
+    "cache_hits": 0,
+    "cache_misses": 0,
+    "api_seconds": 0.0,
+    "max_api_seconds": 0.0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
+
+def get_client():
+    """The process-wide Anthropic client, so every call reuses its connection pool."""
+    global _client
+    with _lock:
+        if _client is None:
+            # Retries are handled here (see is_retryable) so they share the concurrency limit.
+            _client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+        return _client
+
+
+def set_client(client):
+    """Replace the Anthropic client, e.g. with a stub for offline runs."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def set_response_cache(enabled):
+    """Turn the on-disk response cache on or off."""
+    global _use_cache
+    _use_cache = enabled
+
+
+def set_concurrency(limit):
+    """Cap the number of Claude requests in flight across all threads."""
+    global _slots
+    _slots = threading.BoundedSemaphore(limit)
+
+
+def is_retryable(error):
+    """Rate limits, overload and server or connection errors are worth retrying."""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    return isinstance(error, anthropic.APIStatusError) and (
+        error.status_code == 429 or error.status_code >= 500
+    )
+
+
+def _record(**counts):
+    with _lock:
+        for name, value in counts.items():
+            stats[name] += value
+
+
+def _record_response(elapsed, usage, stream):
+    _record(calls=1, cache_misses=1, api_seconds=elapsed)
+    with _lock:
+        stats["max_api_seconds"] = max(stats["max_api_seconds"], elapsed)
+    tokens = {
+        name: getattr(usage, name, None) or 0
+        for name in [
+            "input_tokens", "output_tokens",
+            "cache_creation_input_tokens", "cache_read_input_tokens",
+        ]
+    }
+    _record(**tokens)
+    tracing.event("llm_call", model=MODEL, stream=stream, cache_hit=False, seconds=round(elapsed, 3), **tokens)
+
+
+def format_stats():
+    return (
+        f"LLM: {stats['calls']} API calls ({stats['api_seconds']:.1f}s, "
+        f"slowest {stats['max_api_seconds']:.1f}s), "
+        f"response cache {stats['cache_hits']} hits / {stats['cache_misses']} misses, "
+        f"tokens {stats['input_tokens']} in / {stats['output_tokens']} out, "
+        f"prompt cache {stats['cache_read_input_tokens']} read / "
+        f"{stats['cache_creation_input_tokens']} written"
+    )
+
+
+def build_request(prompt, thinking):
+    """Messages API parameters for a prompt.
+
+    prompt is a string, or a list of strings that are sent as separate text
+    blocks, each marked as a prompt-caching breakpoint. Put large, stable
+    content (instructions, examples, the transcript) first.
+    """
+    if isinstance(prompt, str):
+        content = [{"type": "text", "text": prompt}]
+    else:
+        content = [
+            {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+            for text in prompt
+        ]
+    return {
+        "model": MODEL,
+        "max_tokens": MAX_TOKENS,
+        "thinking": {"type": "enabled" if thinking else "disabled", "budget_tokens": THINKING_BUDGET},
+        "messages": [{"role": "user", "content": content}],
+    }
+
+
+def _cache_path(request):
+    key = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+
+def _load_cached(request):
+    if not _use_cache:
+        return None
+    path = _cache_path(request)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        cached = json.load(f)
+    _record(cache_hits=1)
+    tracing.event("llm_call", model=request["model"], cache_hit=True)
+    return cached["text"]
+
+
+def _save_cached(request, text):
+    if not _use_cache:
+        return
+    path = _cache_path(request)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"model": request["model"], "text": text}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_claude_response(prompt, thinking=True):
+    request = build_request(prompt, thinking)
+    cached = _load_cached(request)
+    if cached is not None:
+        return cached
+
+    def create():
+        with _slots:
+            start = time.perf_counter()
+            response = get_client().messages.create(**request)
+            _record_response(time.perf_counter() - start, getattr(response, "usage", None), stream=False)
+            return response
+
+    response = with_retries(create, is_retryable, "Claude request")
+
+    for block in response.content:
+        if block.type == "thinking":
+            tracing.event("llm_thinking", text=block.thinking)
+    text = response.content[-1].text.strip()
+    _save_cached(request, text)
+    return text
+
+
+def stream_claude_response(prompt, thinking=True):
+    """Yield the text of Claude's response as it is generated."""
+    request = build_request(prompt, thinking)
+    cached = _load_cached(request)
+    if cached is not None:
+        yield from replay_stream(cached)
+        return
+
+    parts = []
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            with _slots:
+                start = time.perf_counter()
+                with get_client().messages.stream(**request) as stream:
+                    for text in stream.text_stream:
+                        parts.append(text)
+                        yield text
+                    usage = getattr(stream.get_final_message(), "usage", None)
+                _record_response(time.perf_counter() - start, usage, stream=True)
+            break
+        except Exception as e:
+            # Once text has been handed to the caller the stream can't be restarted.
+            if parts or attempt == RETRY_ATTEMPTS or not is_retryable(e):
+                raise
+            wait_before_retry("Claude stream", e, attempt)
+    _save_cached(request, "".join(parts).strip())
+
+
+def replay_stream(text, chunk_size=32):
+    """Stand-in for stream_claude_response that replays a saved response in chunks."""
+    for i in range(0, len(text), chunk_size):
+        yield text[i : i + chunk_size]
@@ -1,20 +1,51 @@
 import argparse
-import assemblyai as aai
-import anthropic
+import contextvars
 import os
-import ffmpeg
 import json
 import re
-from difflib import SequenceMatcher
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import llm
+import tracing
+from align import MIN_MATCH_RATIO, align_local, get_aligner
+from batch import DEFAULT_PARALLEL_EPISODES, format_report, resolve_episodes, run_batch, save_report
+from catalog import update_json
+from checkpoints import STAGES, Checkpoint, checkpoint_key, clip_key, file_state
+from envelope import ensure_envelope
+from export import DEFAULT_EXPORT_WORKERS, EXPORT_FORMATS, export_episode
+from llm import get_claude_response, replay_stream, stream_claude_response
+from render import RENDER_MODES, ensure_mezzanine, ensure_proxy, render_clip, source_fingerprint
+from transcript_store import TranscriptStore, is_stale
+from transcription import (
+    DEFAULT_CHUNK_SECONDS, DEFAULT_UPLOADS, DEFAULT_WORKERS as DEFAULT_TRANSCRIBE_WORKERS,
+    AssemblyAITranscriber, get_transcriber, set_upload_limit, transcribe_video,
+)
+
+DEFAULT_JOBS = 8
+CLIP_COUNT = 8
+
+# Chunked discovery: transcripts longer than CHUNKED_DISCOVERY_WORDS are split
+# into overlapping windows that are searched for candidates concurrently.
+CHUNKED_DISCOVERY_WORDS = 50_000
+WINDOW_WORDS = 8_000
+WINDOW_OVERLAP_WORDS = 600
+CANDIDATES_PER_WINDOW = 4
+DUPLICATE_OVERLAP = 0.5  # fraction of the shorter clip two candidates share to count as one moment
+DEFAULT_RENDER_WORKERS = max(1, (os.cpu_count() or 1) // 4)  # x264 already uses several threads
+
 clip_suggestions_prompt = """
 You are writing tweets in the style of top intellectual podcaster, Dwarkesh Patel.
 
 Here's my sense of what makes tweets great:
 It's very helpful when you frame a very specific question or motivation or hook that you're going to answer.
 
-Your task: Identify 8 of the most compelling segments to make clips of.
+Your task: Identify {count} of the most compelling segments to make clips of.
 
 You can create non-consecutive clips by cutting out parts in the middle, or even rearranging segments. 
 And you can define the start and end of the segment wherever you like. 
@@ -25,9 +56,10 @@ This allows you to:
 - Start with the most compelling hook, then jump to supporting content
 - Keep the clip tight and engaging throughout
 
-For each clip, in json format, provide BOTH:
+For each clip, in json format, provide ALL of:
 1. tweet_text - The suggested tweet text that will accompany the video clip
 2. segment_transcripts -list of the exact transcript of the segments that should be used to compose the clip
+3. hook - a short filename for the clip (2-4 words, snake_case, no guest name, no .mp4 extension)
 
 CRITICAL: The segment_transcripts must contain the EXACT words from the source transcript, word-for-word, including filler words and natural speech patterns, so it can be precisely matched to find timestamps in the JSON. 
 Also, segment_transcripts should not include speaker labels (for example "SPEAKER A" or "SPEAKER B").
@@ -45,6 +77,7 @@ Now, here is the transcript to analyze:
 
 clip_suggestion_examples = [
     {
+        "hook": "chinese_stocks_flat",
         "tweet_text": "I asked Victor Shih this question - why has the Chinese stock market been flat for so long despite the economy growing so fast?\n\nThis puzzle is explained via China's system of financial repression.\n\nIf you save money in China, banks are not giving you the true competitive interest rate. Rather, they'll give you the government capped 1.3% (lower than inflation, meaning you're earning a negative return).\n\nThe net interest (which is basically a tax on all Chinese savers) is shoveled into politically favored state owned enterprises that survive only on subsidized credit.\n\nBut here's what I didn't understand at first: Why don't companies just raise equity capital and operate profitably for shareholders?\n\nThe answer apparently is that there's no 'outside' the system.\n\nThe state doesn't just control credit - it controls land, permits, market access, even board seats through Party committees. Companies that prioritize profits over market share lose these privileges. Those that play along get subsidized loans, regulatory favors, and government contracts.\n\nRegular savers, founders, and investors are all turned into unwitting servants of China's industrial policy.",
         "segment_transcripts": [
             "Why is it the case that the Chinese stock market has performed so badly, even though the economy has grown a lot?",
@@ -54,6 +87,7 @@ clip_suggestion_examples = [
         ],
     },
     {
+        "hook": "agi_2030_or_bust",
         "tweet_text": "AGI timelines are very bimodal. It's either by 2030 or bust.\n\nAI progress over the last decade has been driven by scaling training compute of frontier systems (3.55x a year, 160x over 4 years).\n\nThis simply cannot continue beyond this decade, whether you look at chips, power, even fraction of raw GDP used on training.\n\nAfter 2030, AI progress has to mostly come from algorithmic progress. But even there the low hanging fruit will be plucked (at least under the deep learning paradigm).\n\nSo the yearly probability of AGI craters. And we're plausibly looking at 2040+ timelines.\n\nI discuss this dynamic with @_sholtodouglas and @TrentonBricken.",
         "segment_transcripts": [
             "There's another dynamic, which was a reason that Ege and Tame, when they're on the podcast, said that they were pessimistic, is that they think we're further away from solving these problems with long context, coherent agency, advanced multimodality than you think. And then their point is that the progress that's happened in the past over like reasoning or something has required many orders of magnitude increase in compute. And if this scale of compute increase can continue beyond 2030, not just because of chips, but also because of power and like raw GDP even. And because we don't think we get it by 2030 or 2028, the probability per year just goes down a bunch. Yeah, this is like bimodal distribution.",
@@ -62,6 +96,7 @@ clip_suggestion_examples = [
         ],
     },
     {
+        "hook": "humans_conquered_eurasia",
         "tweet_text": "I have been obsessed with what the geneticist David Reich told me in our interview together.\n\nThe story of human evolution we're now learning from new evidence is so crazy.\n\n70,000 years ago, half a dozen different species of humans (Neanderthals, Denisovans, 'Hobbits', etc) lived across Eurasia.\n\nAnd then some small group of modern humans (only 1,000 to 10,000 people) drove all of them to extinction.\n\nEveryone native to Eurasia and America is descended from this one tribe.\n\nHere's the crazy part - modern humans with language and big brains have been around for hundreds of thousands of years.\n\nAnd we had ventured out of Africa before. But we were always beat back by these other humans.\n\nWhat did this small group of humans 70,000 years ago figure out such that they completely dominated the planet?\n\nFull episode out Thursday.",
         "segment_transcripts": [
             "70,000 years ago, there are half a dozen different human species all around the world.",
@@ -71,6 +106,7 @@ clip_suggestion_examples = [
         ],
     },
     {
+        "hook": "japan_lost_decades",
         "tweet_text": "Japan was richer per capita than the US in the late 1980s.\n\nToday it sits at the bottom among developed countries.\n\nHow does an economic superpower fall this far and never recover?\n\nKenneth Rogoff (former Chief Economist of IMF) walked me through what he believes was a catastrophic mistake.\n\nIn 1985, the US pressured Japan to rapidly strengthen the yen and liberalize its financial markets through the Plaza Accord.\n\nThe yen doubled in value in just 3 years. To offset the economic shock, Japan slashed interest rates and flooded the economy with cheap credit.\n\nJapanese banks, suddenly freed from decades of tight regulation, went on a lending spree. They poured money into real estate and stocks with little risk assessment. Japan's stock market became worth more than the US stock market despite having half the population. The total value of Japanese real estate was 4 times the value of all US real estate.\n\nWhen the bubble burst in 1991, banks were left with massive bad loans. The entire financial system seized up, creating a \"lost decade\" of deflation and stagnation.\n\nHere's what stunned me: Rogoff estimates Japan would be 50% wealthier per person today without this crisis.\n\nI didn't grasp before this interview how devastating financial crises are. They don't just cause a temporary recession - they permanently alter a country's growth trajectory.\n\nThree decades later, Japan still hasn't recovered.\n\nFull interview with @krogoff out tomorrow.",
         "segment_transcripts": [
             "So suppose that crisis hadn't happened. How much wealth is Japan today than have other?",
@@ -82,30 +118,20 @@ clip_suggestion_examples = [
 ]
 
 
-def get_claude_response(prompt, thinking=True):
-    client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-    response = client.messages.create(
-        model="claude-sonnet-4-5",
-        max_tokens=16000,
-        thinking={"type": "enabled" if thinking else "disabled", "budget_tokens": 1024},
-        messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-    )
-
-    for block in response.content:
-        if block.type == "thinking":
-            print("Thinking: ", block.thinking)
-    return response.content[-1].text.strip()
+def get_readable_transcript(transcript):
+    return format_utterances((speaker, text) for speaker, _, _, text in transcript.utterances())
 
 
-def get_readable_transcript(transcript_data):
-    transcript = ""
+def format_utterances(utterances):
+    """Render (speaker, text) pairs as the SPEAKER-labelled text Claude reads."""
+    lines = []
     current_speaker = ""
-    for utt in transcript_data["utterances"]:
-        if utt["speaker"] != current_speaker:
-            current_speaker = utt["speaker"]
-            transcript += f"SPEAKER {current_speaker}:\n"
-        transcript += f"{utt['text']}\n"
-    return transcript
+    for speaker, text in utterances:
+        if speaker != current_speaker:
+            current_speaker = speaker
+            lines.append(f"SPEAKER {current_speaker}:\n")
+        lines.append(f"{text}\n")
+    return "".join(lines)
 
 def response_to_json(response):
     """Parse JSON from response, handling markdown-wrapped or raw JSON."""
@@ -120,97 +146,295 @@ def response_to_json(response):
     
     return json.loads(response)
 
-def suggest_clips(transcript_data):
-    readable_transcript = get_readable_transcript(transcript_data)
+def iter_json_objects(chunks):
+    """Yield each top-level JSON object in a stream of text chunks as soon as it closes.
+
+    Anything between objects (array brackets, commas, markdown fences, prose)
+    is skipped, so a JSON array of clips is yielded one clip at a time.
+    """
+    buffer = []
+    depth = 0
+    in_string = escaped = False
+    for chunk in chunks:
+        for char in chunk:
+            if depth == 0:
+                if char == "{":
+                    depth = 1
+                    buffer = [char]
+                continue
+
+            buffer.append(char)
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    yield json.loads("".join(buffer))
+
+
+def get_clip_suggestions_prompt(transcript, readable_transcript=None, count=CLIP_COUNT):
+    """The clip suggestion prompt as [instructions + examples, transcript] blocks.
+
+    Each block is a prompt-caching breakpoint, so repeat calls on the same
+    episode only pay full price for what comes after the transcript.
+    Pass readable_transcript to ask about part of the transcript only.
+    """
+    if readable_transcript is None:
+        readable_transcript = get_readable_transcript(transcript)
     examples_json = json.dumps(clip_suggestion_examples, indent=2, ensure_ascii=False)
 
-    full_prompt = clip_suggestions_prompt.format(
-        examples=examples_json, transcript=readable_transcript
+    instructions, after_transcript = clip_suggestions_prompt.split("{transcript}")
+    return [
+        instructions.format(examples=examples_json, count=count),
+        readable_transcript + after_transcript,
+    ]
+
+
+def suggest_clips(transcript):
+    with tracing.span("suggest_clips") as attrs:
+        response = get_claude_response(get_clip_suggestions_prompt(transcript))
+        suggestions = list(iter_json_objects([response]))
+        attrs["clips"] = len(suggestions)
+    return suggestions
+
+
+def stream_clip_suggestions(transcript, chunks=None):
+    """Yield clip suggestions one by one while Claude is still writing the rest.
+
+    chunks overrides the Claude stream, e.g. with replay_stream() offline.
+    """
+    if chunks is None:
+        chunks = stream_claude_response(get_clip_suggestions_prompt(transcript))
+    # A generator can't hold a span open across yields, so log events instead.
+    start = time.perf_counter()
+    count = 0
+    for suggestion in iter_json_objects(chunks):
+        count += 1
+        tracing.event("clip_suggested", index=count, seconds=round(time.perf_counter() - start, 3))
+        yield suggestion
+    tracing.event("suggest_clips", clips=count, streamed=True, seconds=round(time.perf_counter() - start, 3))
+
+
+def transcript_windows(transcript, window_words=WINDOW_WORDS, overlap_words=WINDOW_OVERLAP_WORDS):
+    """Split the utterances into windows of about window_words words.
+
+    Windows break at speaker turns and each one repeats the last
+    overlap_words or so of the previous window, so a moment near a boundary
+    is seen whole at least once. Monologues longer than a window are cut
+    into window-sized pieces. Returns lists of (speaker, text) pairs.
+    """
+    utterances = []
+    for speaker, _, _, text in transcript.utterances():
+        words = text.split()
+        for i in range(0, len(words), window_words):
+            utterances.append((speaker, words[i : i + window_words]))
+
+    windows = []
+    start = 0
+    while start < len(utterances):
+        end, count = start, 0
+        while end < len(utterances) and (end == start or count < window_words):
+            count += len(utterances[end][1])
+            end += 1
+        windows.append([(speaker, " ".join(words)) for speaker, words in utterances[start:end]])
+        if end == len(utterances):
+            break
+
+        next_start, overlap = end, 0
+        while next_start > start + 1 and overlap < overlap_words:
+            next_start -= 1
+            overlap += len(utterances[next_start][1])
+        start = next_start
+    return windows
+
+
+def find_window_candidates(transcript, window, idx):
+    """Ask Claude for candidate clips within one transcript window."""
+    prompt = get_clip_suggestions_prompt(transcript, format_utterances(window), CANDIDATES_PER_WINDOW)
+    with tracing.span("discover_window", window=idx, utterances=len(window)) as attrs:
+        response = get_claude_response(prompt)
+        candidates = list(iter_json_objects([response]))
+        attrs["candidates"] = len(candidates)
+    print(f"Window {idx + 1}: {len(candidates)} candidates")
+    return candidates
+
+
+def overlap_fraction(a, b):
+    """Share of the shorter of two clips' timestamps that the other also covers."""
+    shared = sum(
+        max(0, min(x["end_ms"], y["end_ms"]) - max(x["start_ms"], y["start_ms"]))
+        for x in a for y in b
     )
-    response = get_claude_response(full_prompt)
-    clip_suggestions = response_to_json(response)
-    return clip_suggestions
-
-
-def segment_transcript_to_timestamps(segment_transcript, transcript_data):
+    shorter = min(sum(t["duration_ms"] for t in a), sum(t["duration_ms"] for t in b))
+    return shared / shorter if shorter else 0
+
+
+def dedup_candidates(candidates, transcript):
+    """Drop candidates that can't be aligned or that cover the same moment as an earlier one."""
+    kept, kept_timestamps = [], []
+    for candidate, timestamps in zip(candidates, get_timestamps_for_suggestions(candidates, transcript)):
+        if not timestamps:
+            continue
+        if any(overlap_fraction(timestamps, other) > DUPLICATE_OVERLAP for other in kept_timestamps):
+            continue
+        kept.append(candidate)
+        kept_timestamps.append(timestamps)
+    return kept, kept_timestamps
+
+
+def rank_candidates(candidates, candidate_timestamps, count=CLIP_COUNT):
+    """Pick the best count candidates with one cheap Claude request that never sees the transcript."""
+    if len(candidates) <= count:
+        return candidates
+
+    described = "\n\n".join(
+        f"Candidate {i} ({len(timestamps)} segments, "
+        f"{sum(t['duration_ms'] for t in timestamps) / 1000:.0f}s):\n{c['tweet_text']}"
+        for i, (c, timestamps) in enumerate(zip(candidates, candidate_timestamps))
+    )
+    prompt = f"""These candidate clips come from different parts of one podcast episode.
+Pick the {count} that would make the most compelling standalone tweets, best first.
+If two candidates make the same point, pick only the better one.
+
+{described}
+
+Return ONLY a JSON object with the candidate numbers:
+{{"picks": [3, 0, ...]}}"""
+
+    with tracing.span("discover_rank", candidates=len(candidates)) as attrs:
+        try:
+            picks = next(iter_json_objects([get_claude_response(prompt, thinking=False)]))["picks"]
+        except Exception as e:
+            print(f"WARNING: Ranking candidates failed, keeping transcript order ({e})")
+            attrs["fallback"] = str(e)
+            picks = []
+
+    chosen = []
+    for i in picks:
+        if isinstance(i, int) and 0 <= i < len(candidates) and i not in chosen:
+            chosen.append(i)
+    # Top up in transcript order if the ranking came back short.
+    chosen += [i for i in range(len(candidates)) if i not in chosen][: count - len(chosen)]
+    return [candidates[i] for i in chosen[:count]]
+
+
+def discover_clips_chunked(transcript, workers=DEFAULT_JOBS):
+    """Map-reduce clip discovery for transcripts too long for one request.
+
+    Each window is searched for candidates concurrently, so latency is
+    bounded by the slowest window. Candidates are then aligned, deduplicated
+    across overlapping windows and ranked down to CLIP_COUNT.
+    """
+    windows = transcript_windows(transcript)
+    print(f"Searching {len(windows)} transcript windows for clips")
+    with tracing.span("discover", windows=len(windows)) as attrs:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, find_window_candidates, transcript, window, idx)
+                for idx, window in enumerate(windows)
+            ]
+            candidates = []
+            for future in futures:
+                try:
+                    candidates += future.result()
+                except Exception as e:
+                    print(f"WARNING: A transcript window failed ({e})")
+        candidates, candidate_timestamps = dedup_candidates(candidates, transcript)
+        attrs["candidates"] = len(candidates)
+        return rank_candidates(candidates, candidate_timestamps)
+
+
+def segment_transcript_to_timestamps(segment_transcript, transcript):
     """Find timestamps for a segment of transcript text."""
-    words = transcript_data["words"]
-    segment_words = segment_transcript.lower().split()
-    transcript_words = [w["text"].lower() for w in words]
-
-    best_ratio, best_start = 0, 0
-    window_size = len(segment_words)
-
-    for i in range(len(transcript_words) - window_size + 1):
-        window = transcript_words[i : i + window_size]
-        ratio = SequenceMatcher(None, segment_words, window).ratio()
-        if ratio > best_ratio:
-            best_ratio = ratio
-            best_start = i
-
-    if best_ratio < 0.7:
-        print(f"WARNING: Low confidence match ({best_ratio:.2%})")
-        return None, None
+    start_ms, end_ms, ratio = get_aligner(transcript).find(segment_transcript)
 
-    start_ms = words[best_start]["start"]
-    end_ms = words[best_start + window_size - 1]["end"]
+    if ratio < MIN_MATCH_RATIO:
+        print(f"WARNING: Low confidence match ({ratio:.2%})")
+        return None, None
 
     return start_ms, end_ms
 
 
-def generate_hook_name(tweet_text):
-    prompt = f"""Generate a short filename (2-4 words, snake_case) for this tweet. Don't include the guest name.
-    Tweet: {tweet_text}
-    Return ONLY the filename without .mp4 extension. Example: rl_terrible"""
+HOOK_STOPWORDS = {
+    "the", "and", "for", "that", "this", "with", "was", "are", "but", "not", "you",
+    "your", "have", "has", "had", "its", "it's", "they", "them", "their", "there",
+    "what", "why", "how", "who", "when", "where", "which", "from", "into", "about",
+    "just", "even", "than", "then", "been", "being", "were", "will", "would", "could",
+    "should", "can", "did", "does", "out", "our", "all", "any", "one", "more", "most",
+    "very", "really", "here", "full", "episode", "interview", "told", "asked", "me",
+}
+
 
-    hook = get_claude_response(prompt, thinking=False).strip().lower()
+def sanitize_hook(hook):
+    hook = hook.strip().lower()
     hook = "".join(c if c.isalnum() or c == "_" else "_" for c in hook)
-    hook = "_".join(hook.split("_")[:5])
-    return hook
-
-
-def extract_segment(video_path, start_ms, duration_ms, output_path):
-    """Extract a single segment with square crop."""
-    input_stream = ffmpeg.input(str(video_path), ss=start_ms / 1000, t=duration_ms / 1000)
-    video = input_stream.video.filter("crop", "min(iw,ih)", "min(iw,ih)")
-    audio = input_stream.audio
-    (
-        ffmpeg.output(video, audio, str(output_path), vcodec="libx264", acodec="aac")
-        .overwrite_output()
-        .run(capture_stdout=True, capture_stderr=True)
-    )
+    return "_".join([part for part in hook.split("_") if part][:5])
 
 
-def render_clip(video_path, timestamps, output_path):
-    """Render clip from timestamps."""
-    temp_dir = output_path.parent / "temp"
-    temp_dir.mkdir(exist_ok=True)
-
-    # Extract all segments
-    temp_files = []
-    for idx, ts in enumerate(timestamps):
-        temp_file = temp_dir / f"seg_{idx}.mp4"
-        extract_segment(video_path, ts["start_ms"], ts["duration_ms"], temp_file)
-        temp_files.append(temp_file)
-
-    # Concatenate
-    concat_file = temp_dir / "concat.txt"
-    with open(concat_file, "w") as f:
-        for temp_file in temp_files:
-            f.write(f"file '{temp_file.resolve()}'\n")
-
-    (
-        ffmpeg.input(str(concat_file), format="concat", safe=0)
-        .output(str(output_path), c="copy")
-        .overwrite_output()
-        .run(capture_stdout=True, capture_stderr=True)
-    )
+def keyword_hook(tweet_text, max_words=3):
+    """Offline hook name: the tweet's most frequent keywords, in order of first use."""
+    words = re.findall(r"[a-z0-9']+", tweet_text.lower())
+    keywords = [w for w in words if len(w) > 2 and w not in HOOK_STOPWORDS]
+    counts = Counter(keywords)
+    top = sorted(counts, key=lambda w: (-counts[w], keywords.index(w)))[:max_words]
+    return sanitize_hook("_".join(sorted(top, key=keywords.index))) or "clip"
+
+
+def generate_hook_names(tweet_texts):
+    """Name every clip with one Claude request, falling back to keyword_hook offline."""
+    tweets = "\n\n".join(f"Tweet {i}:\n{text}" for i, text in enumerate(tweet_texts, 1))
+    prompt = f"""Generate a short filename (2-4 words, snake_case) for each of these tweets. Don't include the guest name.
 
-    # Cleanup
-    for f in temp_files:
-        f.unlink()
-    concat_file.unlink()
-    temp_dir.rmdir()
+{tweets}
+
+Return ONLY a JSON object with the filenames, without .mp4 extension, in the same order as the tweets:
+{{"hooks": ["rl_terrible", "..."]}}"""
+
+    with tracing.span("name_hooks", clips=len(tweet_texts)) as attrs:
+        try:
+            response = get_claude_response(prompt, thinking=False)
+            hooks = next(iter_json_objects([response]))["hooks"]
+        except Exception as e:
+            print(f"WARNING: Hook naming failed, using keywords instead ({e})")
+            attrs["fallback"] = str(e)
+            hooks = []
+
+    names = []
+    for i, tweet_text in enumerate(tweet_texts):
+        hook = sanitize_hook(hooks[i]) if i < len(hooks) and isinstance(hooks[i], str) else ""
+        names.append(hook or keyword_hook(tweet_text))
+    return names
+
+
+_hook_lock = threading.Lock()
+
+
+def claim_hook(hook, clips_dir, claimed, own=None):
+    """Return hook, or hook_2, hook_3... if the name is already taken.
+
+    A name is taken if this run already used it or a clip with that name
+    exists in clips_dir, so two clips never overwrite each other's files.
+    `own` is the clip's name from a previous run, which it may keep.
+    """
+    with _hook_lock:
+        candidate, n = hook, 2
+        while candidate in claimed or (candidate != own and (
+            (clips_dir / f"{candidate}.mp4").exists()
+            or (clips_dir / f"{candidate}_metadata.json").exists()
+        )):
+            candidate = f"{hook}_{n}"
+            n += 1
+        claimed.add(candidate)
+        return candidate
 
 
 def save_transcript_json(transcript_data: dict, json_path: str):
@@ -225,82 +449,314 @@ def load_transcript_json(json_path: str) -> dict:
         return json.load(f)
 
 
-def transcribe(episode_dir):
-    """Transcribe video.mp4 in episode directory."""
+def load_transcript(episode_dir, transcript_data=None):
+    """Open the episode's transcript store, rebuilding it if transcript.json changed."""
+    transcript_path = episode_dir / "transcript.json"
+    store_dir = episode_dir / "transcript_store"
+    if is_stale(store_dir, transcript_path):
+        if transcript_data is None:
+            transcript_data = load_transcript_json(str(transcript_path))
+        TranscriptStore.from_transcript_data(transcript_data).save(store_dir, transcript_path)
+    return TranscriptStore(store_dir)
+
+
+def transcribe(
+    episode_dir, transcriber=None, chunk_seconds=DEFAULT_CHUNK_SECONDS, workers=DEFAULT_TRANSCRIBE_WORKERS,
+    force=False,
+):
+    """Transcribe video.mp4 in episode directory, unless it already has a transcript (or force)."""
     video_path = episode_dir / "video.mp4"
     transcript_path = episode_dir / "transcript.json"
 
-    if transcript_path.exists():
+    if transcript_path.exists() and not force:
         print("Loading existing transcript")
-        return load_transcript_json(str(transcript_path))
+        with tracing.span("transcribe", cached=True):
+            return load_transcript(episode_dir)
 
     print("Generating new transcript")
-    audio_path = episode_dir / "temp_audio.wav"
+    with tracing.span("transcribe", cached=False) as attrs:
+        transcript_data = transcribe_video(
+            video_path, transcriber or AssemblyAITranscriber(),
+            chunk_seconds=chunk_seconds, workers=workers,
+        )
+        attrs["words"] = len(transcript_data["words"])
+        save_transcript_json(transcript_data, str(transcript_path))
+        return load_transcript(episode_dir, transcript_data)
+
+
+def analyze_audio(episode_dir):
+    """Compute the episode's audio envelope, used to snap cuts to pauses."""
+    with tracing.span("envelope"):
+        ensure_envelope(episode_dir)
+
+
+def get_timestamps_for_suggestions(clip_suggestions, transcript):
+    """Convert the segment transcripts of every suggestion to timestamps in one batch."""
+    segments = [s for suggestion in clip_suggestions for s in suggestion["segment_transcripts"]]
+    with tracing.span("align", segments=len(segments)):
+        matches = iter(get_aligner(transcript).align_batch(segments))
+
+    all_timestamps = []
+    for suggestion in clip_suggestions:
+        timestamps = []
+        for segment in suggestion["segment_transcripts"]:
+            start_ms, end_ms, ratio = next(matches)
+            tracing.event(
+                "align_segment", words=len(segment.split()), ratio=round(ratio, 4),
+                start_ms=start_ms, end_ms=end_ms, matched=ratio >= MIN_MATCH_RATIO,
+            )
+            if ratio < MIN_MATCH_RATIO:
+                print(f"WARNING: Low confidence match ({ratio:.2%})")
+                continue
+            timestamps.append({
+                "start_ms": start_ms,
+                "end_ms": end_ms,
+                "duration_ms": end_ms - start_ms,
+            })
+        all_timestamps.append(timestamps)
+    return all_timestamps
 
-    ffmpeg.input(str(video_path)).output(
-        str(audio_path), acodec="pcm_s16le", ar="16000"
-    ).overwrite_output().run(capture_stdout=True, capture_stderr=True)
 
-    aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
-    config = aai.TranscriptionConfig(
-        speaker_labels=True,
-        speech_models=["slam-1"],
-    )
-    aai_transcript = aai.Transcriber().transcribe(str(audio_path), config=config)
-    transcript_data = aai_transcript.json_response
-    save_transcript_json(transcript_data, str(transcript_path))
-    audio_path.unlink()
-    return transcript_data
+def get_timestamps_for_segments(segment_transcripts, transcript):
+    """Convert segment transcripts to timestamps."""
+    suggestion = {"segment_transcripts": segment_transcripts}
+    return get_timestamps_for_suggestions([suggestion], transcript)[0]
 
 
-def get_timestamps_for_segments(segment_transcripts, transcript_data):
-    """Convert segment transcripts to timestamps."""
+def realign_segments(segment_transcripts, previous_segments, previous_timestamps, transcript):
+    """Timestamps for an iterated clip's segments, searching near its previous segments first.
+
+    Segments whose text didn't change keep their timestamps (when every
+    previous segment matched, so timestamps line up with segments). The rest
+    are matched within align.LOCAL_PADDING_MS of the previous segments, and
+    only searched for across the whole episode if no local match clears
+    MIN_MATCH_RATIO.
+    """
+    reusable = {}
+    if len(previous_timestamps) == len(previous_segments):
+        reusable = dict(zip(previous_segments, previous_timestamps))
+    ranges = [(ts["start_ms"], ts["start_ms"] + ts["duration_ms"]) for ts in previous_timestamps]
+
     timestamps = []
-    for segment_transcript in segment_transcripts:
-        start_ms, end_ms = segment_transcript_to_timestamps(
-            segment_transcript, transcript_data
-        )
-        if start_ms is not None:
+    with tracing.span("align", segments=len(segment_transcripts), incremental=True) as attrs:
+        found = Counter()
+        for segment in segment_transcripts:
+            if segment in reusable:
+                found["reused"] += 1
+                timestamps.append(reusable[segment])
+                continue
+
+            start_ms, end_ms, ratio = align_local(transcript, segment, ranges) if ranges else (None, None, 0)
+            search = "local"
+            if ratio < MIN_MATCH_RATIO:
+                start_ms, end_ms, ratio = get_aligner(transcript).align_batch([segment])[0]
+                search = "global"
+            found[search] += 1
+            tracing.event(
+                "align_segment", words=len(segment.split()), ratio=round(ratio, 4), search=search,
+                start_ms=start_ms, end_ms=end_ms, matched=ratio >= MIN_MATCH_RATIO,
+            )
+            if ratio < MIN_MATCH_RATIO:
+                print(f"WARNING: Low confidence match ({ratio:.2%})")
+                continue
             timestamps.append({
                 "start_ms": start_ms,
                 "end_ms": end_ms,
                 "duration_ms": end_ms - start_ms,
             })
+        attrs.update(found)
+    return timestamps
+
+
+def align_clip(suggestion, transcript, checkpoint=None):
+    """Timestamps of a suggestion's segments, reusing the checkpointed alignment if there is one."""
+    if checkpoint is None:
+        return get_timestamps_for_segments(suggestion["segment_transcripts"], transcript)
+    clip = clip_key(suggestion)
+    key = checkpoint_key(suggestion["segment_transcripts"], MIN_MATCH_RATIO)
+    timestamps = checkpoint.get(clip, "align", key)
+    if timestamps is None:
+        timestamps = get_timestamps_for_segments(suggestion["segment_transcripts"], transcript)
+        checkpoint.put(clip, "align", key, timestamps)
     return timestamps
 
 
+def render_key(video_path, timestamps, render_mode):
+    return checkpoint_key(source_fingerprint(video_path), timestamps, render_mode)
+
+
 def save_clip_files(clips_dir, hook, suggestion, timestamps):
-    """Save clip tweet text and metadata."""
+    """Save clip tweet text and metadata, marked as not rendered yet."""
     tweet_path = clips_dir / f"{hook}_tweet.txt"
     metadata_path = clips_dir / f"{hook}_metadata.json"
 
     with open(tweet_path, "w", encoding="utf-8") as f:
         f.write(suggestion["tweet_text"])
 
-    metadata = {
-        "hook": hook,
-        "tweet_text": suggestion["tweet_text"],
-        "segment_transcripts": suggestion["segment_transcripts"],
-        "timestamps": timestamps,
-    }
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    def replace(metadata):
+        metadata.clear()
+        metadata.update({
+            "hook": hook,
+            "tweet_text": suggestion["tweet_text"],
+            "segment_transcripts": suggestion["segment_transcripts"],
+            "timestamps": timestamps,
+            "rendered": False,
+        })
+
+    update_json(metadata_path, replace)
 
     return clips_dir / f"{hook}.mp4"
 
 
-def process_clip(suggestion, transcript_data, video_path, clips_dir, idx, total):
-    timestamps = get_timestamps_for_segments(
-        suggestion["segment_transcripts"], transcript_data
-    )
+def mark_rendered(clips_dir, hook):
+    """Record that the clip's mp4 matches its metadata, so the review page plays it instead of a preview."""
+    update_json(clips_dir / f"{hook}_metadata.json", lambda metadata: metadata.update(rendered=True))
+
+
+def remove_clip_files(clips_dir, hook):
+    """Delete a clip's video, previews and text files, e.g. after it was renamed."""
+    for suffix in [".mp4", "_poster.jpg", "_sprite.jpg", "_tweet.txt", "_metadata.json"]:
+        (clips_dir / f"{hook}{suffix}").unlink(missing_ok=True)
+
+
+def process_clip(
+    suggestion, timestamps, video_path, clips_dir, idx, render_pool, render_mode, claimed, checkpoint=None,
+    preview_only=False,
+):
+    clip = clip_key(suggestion)
+    name_key = checkpoint_key(suggestion.get("hook"), suggestion["tweet_text"])
+    saved = checkpoint.get(clip, "name", name_key) if checkpoint else None
+    previous = checkpoint.saved(clip, "name") if checkpoint else None
+    hook = sanitize_hook(suggestion.get("hook") or "") or keyword_hook(suggestion["tweet_text"])
+    hook = claim_hook(saved or hook, clips_dir, claimed, own=previous)
+    if checkpoint and hook != saved:
+        checkpoint.put(clip, "name", name_key, hook)
+        if previous and previous != hook:
+            remove_clip_files(clips_dir, previous)
+
+    with tracing.span("clip", index=idx, hook=hook, segments=len(timestamps)) as attrs:
+        clip_path = clips_dir / f"{hook}.mp4"
+        key = render_key(video_path, timestamps, render_mode)
+        rendered = checkpoint.get(clip, "render", key) if checkpoint else None
+        if (
+            rendered is not None and (clips_dir / f"{hook}_metadata.json").exists()
+            and (preview_only or (not rendered.get("preview") and rendered["file"] == file_state(clip_path)))
+        ):
+            print(f"[{idx}] {hook}: up to date")
+            attrs["skipped"] = True
+            return
+
+        # An iterated clip keeps its edited text along with its edited timestamps
+        edited = checkpoint.saved(clip, "edit") if checkpoint else None
+        if edited and edited["timestamps"] == timestamps:
+            suggestion = edited["suggestion"]
+        clip_path = save_clip_files(clips_dir, hook, suggestion, timestamps)
+        if preview_only:
+            if checkpoint:
+                checkpoint.put(clip, "render", key, {"file": None, "preview": True})
+            print(f"[{idx}] {hook}: saved for preview")
+            return
 
-    hook = generate_hook_name(suggestion["tweet_text"])
-    clip_path = save_clip_files(clips_dir, hook, suggestion, timestamps)
-    render_clip(video_path, timestamps, clip_path)
+        print(f"[{idx}] {hook}: rendering")
+        render_pool.submit(
+            tracing.call_in_run, tracing.current(),
+            render_clip, video_path, timestamps, clip_path, render_mode,
+        ).result()
+        mark_rendered(clips_dir, hook)
+        if checkpoint:
+            checkpoint.put(clip, "render", key, {"file": file_state(clip_path)})
+        print(f"[{idx}] {hook}: done")
+
+
+def produce_clips(
+    clip_suggestions, transcript, video_path, clips_dir,
+    jobs=DEFAULT_JOBS, render_workers=DEFAULT_RENDER_WORKERS, render_mode="cached",
+    render_pool=None, checkpoint=None, preview_only=False,
+):
+    """Align, name and render clips concurrently.
+
+    clip_suggestions may be a generator: each clip is aligned as soon as it
+    arrives and handed to a thread pool of `jobs` threads, which name it and
+    wait on its render in a pool of `render_workers` processes (rendering is
+    CPU-bound). Pass render_pool to share one render limit across episodes.
+    With a checkpoint, steps already done for a clip are skipped. With
+    preview_only, clips are saved but not rendered.
+    Returns (clips, failed).
+    """
+    if render_pool is None:
+        with ProcessPoolExecutor(max_workers=render_workers) as render_pool:
+            return produce_clips(
+                clip_suggestions, transcript, video_path, clips_dir,
+                jobs, render_workers, render_mode, render_pool, checkpoint, preview_only,
+            )
+
+    failed = 0
+    claimed = set()
+    with ThreadPoolExecutor(max_workers=jobs) as name_pool:
+        futures = {}
+        for idx, suggestion in enumerate(clip_suggestions, 1):
+            timestamps = align_clip(suggestion, transcript, checkpoint)
+            print(f"[{idx}] Suggested clip with {len(timestamps)} matched segments")
+            future = name_pool.submit(
+                contextvars.copy_context().run, process_clip, suggestion, timestamps, video_path, clips_dir, idx,
+                render_pool, render_mode, claimed, checkpoint, preview_only,
+            )
+            futures[future] = idx
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                stderr = getattr(e, "stderr", None)
+                print(f"[{futures[future]}] Failed: {stderr.decode(errors='replace') if stderr else e}")
+                failed += 1
+    return len(futures), failed
+
+
+def iterate_on_clip(episode_name, hook, feedback, render_mode="cached", preview_only=False):
+    episode_dir = Path("episodes") / episode_name
+    with tracing.run(episode_dir / "logs", "iterate", episode=episode_name, hook=hook, render_mode=render_mode):
+        _iterate_on_clip(episode_dir, hook, feedback, render_mode, preview_only)
 
 
-def iterate_on_clip(episode_name, hook, feedback):
+def render_saved_clip(episode_name, hook, render_mode="cached"):
+    """Render a clip from its saved metadata, e.g. one that was only previewed until approved."""
     episode_dir = Path("episodes") / episode_name
+    with tracing.run(episode_dir / "logs", "render", episode=episode_name, hook=hook, render_mode=render_mode):
+        clips_dir = episode_dir / "clips"
+        with open(clips_dir / f"{hook}_metadata.json", "r", encoding="utf-8") as f:
+            timestamps = json.load(f)["timestamps"]
+        render_and_checkpoint(episode_dir, hook, timestamps, render_mode)
+
+
+def render_and_checkpoint(episode_dir, hook, timestamps, render_mode, preview_only=False, suggestion=None):
+    """Render a saved clip (unless preview_only) and record it in the episode's checkpoint.
+
+    The checkpoint keeps the clip's current timestamps, and the edited
+    suggestion they were aligned from if given, so a rerun keeps an edited
+    clip rather than restoring the original suggestion's.
+    """
+    video_path = episode_dir / "video.mp4"
+    clips_dir = episode_dir / "clips"
+    clip_path = clips_dir / f"{hook}.mp4"
+    if preview_only:
+        output = {"file": None, "preview": True}
+    else:
+        render_clip(video_path, timestamps, clip_path, mode=render_mode)
+        mark_rendered(clips_dir, hook)
+        output = {"file": file_state(clip_path)}
+
+    checkpoint = Checkpoint(episode_dir / "checkpoint.json")
+    clip = checkpoint.find_clip(hook)
+    if clip:
+        if suggestion is not None:
+            edited = {key: suggestion[key] for key in ["tweet_text", "segment_transcripts"]}
+            checkpoint.put(clip, "edit", None, {"suggestion": edited, "timestamps": timestamps})
+        checkpoint.update(clip, "align", timestamps)
+        checkpoint.update(clip, "render", output, key=render_key(video_path, timestamps, render_mode))
+
+
+def _iterate_on_clip(episode_dir, hook, feedback, render_mode, preview_only):
     clips_dir = episode_dir / "clips"
     metadata_path = clips_dir / f"{hook}_metadata.json"
 
@@ -333,46 +789,252 @@ CRITICAL: segment_transcripts must be EXACT quotes from the original transcript,
     response = get_claude_response(prompt)
     updated_suggestion = response_to_json(response)
 
-    transcript_data = load_transcript_json(str(episode_dir / "transcript.json"))
+    transcript = load_transcript(episode_dir)
+    analyze_audio(episode_dir)
+
+    timestamps = realign_segments(
+        updated_suggestion["segment_transcripts"], metadata["segment_transcripts"],
+        metadata.get("timestamps") or [], transcript,
+    )
+
+    save_clip_files(clips_dir, hook, updated_suggestion, timestamps)
+    render_and_checkpoint(episode_dir, hook, timestamps, render_mode, preview_only, updated_suggestion)
+
+
+def export_approved(episode_name, formats, captions=False, workers=DEFAULT_EXPORT_WORKERS):
+    """Export an episode's approved clips to every format. Returns (clips, failed)."""
+    episode_dir = Path("episodes") / episode_name
+    with tracing.run(episode_dir / "logs", "export", episode=episode_name, formats=formats, captions=captions):
+        transcript = load_transcript(episode_dir) if captions else None
+        return export_episode(episode_dir, formats, transcript, workers)
+
+
+def process_episode(episode_name, args, render_pool):
+    """Transcribe an episode, then suggest, align and render its clips. Returns (clips, failed).
+
+    Every stage is traced to episodes/<name>/logs/<run id>.jsonl.
+    """
+    episode_dir = Path("episodes") / episode_name
+    with tracing.run(episode_dir / "logs", "generate", episode=episode_name, render_mode=args.render_mode) as attrs:
+        attrs["clips"], attrs["failed"] = _process_episode(episode_dir, args, render_pool)
+        return attrs["clips"], attrs["failed"]
+
+
+def _process_episode(episode_dir, args, render_pool):
+    clips_dir = episode_dir / "clips"
     video_path = episode_dir / "video.mp4"
+    if not video_path.exists():
+        raise FileNotFoundError(f"{video_path} not found")
+    clips_dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = Checkpoint(episode_dir / "checkpoint.json", args.force)
+
+    # The audio envelope, the preview proxy and the smart-cut mezzanine only
+    # need the video, so build them while transcribing
+    with ThreadPoolExecutor(max_workers=2) as prepare_pool:
+        prepared = [prepare_pool.submit(contextvars.copy_context().run, analyze_audio, episode_dir)]
+        if args.preview_only:
+            prepared.append(prepare_pool.submit(contextvars.copy_context().run, ensure_proxy, video_path))
+        elif args.render_mode == "smart" and shutil.which("ffprobe"):
+            prepared.append(prepare_pool.submit(contextvars.copy_context().run, ensure_mezzanine, video_path))
+        transcript = transcribe(
+            episode_dir, get_transcriber(args.transcriber),
+            args.chunk_minutes * 60, args.transcribe_workers, force="transcribe" in checkpoint.force,
+        )
+        for future in prepared:
+            future.result()
+    checkpoint.set_transcript(source_fingerprint(episode_dir / "transcript.json"))
+
+    if args.replay_suggestions:
+        discovery = "replay"
+    elif args.discovery == "chunked" or (
+        args.discovery == "auto" and len(transcript) > CHUNKED_DISCOVERY_WORDS
+    ):
+        discovery = "chunked"
+    else:
+        discovery = "no-stream" if args.no_stream else "stream"
+    suggest_key = checkpoint_key(
+        discovery, CLIP_COUNT,
+        source_fingerprint(args.replay_suggestions) if args.replay_suggestions else None,
+    )
 
-    timestamps = get_timestamps_for_segments(
-        updated_suggestion["segment_transcripts"], transcript_data
+    clip_suggestions = checkpoint.suggestions(suggest_key)
+    if clip_suggestions is not None:
+        print(f"Reusing {len(clip_suggestions)} clip suggestions from {checkpoint.path}")
+    else:
+        clip_suggestions = checkpoint.record_suggestions(
+            suggest_key, get_suggestions(transcript, discovery, args)
+        )
+
+    return produce_clips(
+        clip_suggestions, transcript, video_path, clips_dir,
+        args.jobs, args.render_workers, args.render_mode, render_pool, checkpoint, args.preview_only,
     )
 
-    clip_path = save_clip_files(clips_dir, hook, updated_suggestion, timestamps)
-    render_clip(video_path, timestamps, clip_path)
+
+def get_suggestions(transcript, discovery, args):
+    """Clip suggestions from the chosen discovery method (a generator when streaming)."""
+    if discovery == "replay":
+        with open(args.replay_suggestions, "r", encoding="utf-8") as f:
+            return stream_clip_suggestions(transcript, replay_stream(f.read()))
+    if discovery == "chunked":
+        return discover_clips_chunked(transcript, args.jobs)
+    if discovery == "no-stream":
+        clip_suggestions = suggest_clips(transcript)
+        unnamed = [s for s in clip_suggestions if not sanitize_hook(s.get("hook") or "")]
+        if unnamed:
+            hooks = generate_hook_names([s["tweet_text"] for s in unnamed])
+            for suggestion, hook in zip(unnamed, hooks):
+                suggestion["hook"] = hook
+        return clip_suggestions
+    return stream_clip_suggestions(transcript)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("episode_name", help="Episode name (e.g., 'karpathy')")
+    parser.add_argument(
+        "episode_names", nargs="*", metavar="episode",
+        help="Episode names or glob patterns (e.g., 'karpathy' or 'k*')",
+    )
+    parser.add_argument("--all", action="store_true", help="Process every episode in episodes/")
     parser.add_argument("--iterate", help="Hook name of clip to iterate on")
     parser.add_argument("--feedback", help="Feedback for iteration")
+    parser.add_argument("--render", metavar="HOOK", help="Render a saved clip, e.g. one saved with --preview-only")
+    parser.add_argument(
+        "--preview-only", action="store_true",
+        help="Save clips without rendering them; the review page previews them from the episode video",
+    )
+    parser.add_argument(
+        "--export", action="store_true",
+        help="Export approved clips to episodes/<name>/exports/<hook>/, skipping formats already up to date",
+    )
+    parser.add_argument(
+        "--format", dest="formats", action="append", choices=list(EXPORT_FORMATS), metavar="FORMAT",
+        help=f"Export format ({', '.join(EXPORT_FORMATS)}; repeatable, default all)",
+    )
+    parser.add_argument("--captions", action="store_true", help="Burn captions into exports from the word timestamps")
+    parser.add_argument(
+        "--export-workers", type=int, default=DEFAULT_EXPORT_WORKERS,
+        help="Clips exported concurrently (each encodes all its formats in one ffmpeg run)",
+    )
+    parser.add_argument(
+        "--render-mode", choices=RENDER_MODES, default="cached",
+        help="cached: reuse cached segments, encode only new ones; "
+        "graph: one ffmpeg filter graph per clip; segments: encode each segment then concat; "
+        "smart: stream-copy from a cropped copy of the episode, encoding only up to each segment's first keyframe",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=DEFAULT_JOBS,
+        help="Clips processed concurrently",
+    )
+    parser.add_argument(
+        "--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+        help="Concurrent ffmpeg renders, shared by all episodes",
+    )
+    parser.add_argument(
+        "--parallel-episodes", type=int, default=DEFAULT_PARALLEL_EPISODES,
+        help="Episodes processed at once in batch mode",
+    )
+    parser.add_argument(
+        "--llm-concurrency", type=int, default=llm.DEFAULT_CONCURRENCY,
+        help="Claude requests in flight at once, shared by all episodes",
+    )
+    parser.add_argument(
+        "--upload-concurrency", type=int, default=DEFAULT_UPLOADS,
+        help="Transcription uploads in flight at once, shared by all episodes",
+    )
+    parser.add_argument("--report", metavar="FILE", help="Write the batch summary as JSON")
+    parser.add_argument(
+        "--discovery", choices=["auto", "single", "chunked"], default="auto",
+        help="single: one request over the whole transcript; chunked: search overlapping windows "
+        f"concurrently, then rank; auto: chunked above {CHUNKED_DISCOVERY_WORDS} words",
+    )
+    parser.add_argument(
+        "--no-stream", action="store_true",
+        help="Wait for all clip suggestions before aligning and rendering any of them",
+    )
+    parser.add_argument(
+        "--replay-suggestions", metavar="FILE",
+        help="Stream clip suggestions from a saved response instead of calling Claude",
+    )
+    parser.add_argument(
+        "--no-llm-cache", action="store_true",
+        help="Always call Claude instead of reusing identical earlier responses",
+    )
+    parser.add_argument(
+        "--transcriber", default="assemblyai",
+        help="assemblyai, or replay:<transcript.json> to transcribe offline from an existing transcript",
+    )
+    parser.add_argument(
+        "--chunk-minutes", type=float, default=DEFAULT_CHUNK_SECONDS / 60,
+        help="Split longer episodes into overlapping chunks transcribed concurrently (0 disables)",
+    )
+    parser.add_argument(
+        "--transcribe-workers", type=int, default=DEFAULT_TRANSCRIBE_WORKERS,
+        help="Chunks transcribed concurrently",
+    )
+    parser.add_argument(
+        "--force", action="append", choices=STAGES, default=[], metavar="STAGE",
+        help="Redo a stage even if episodes/<name>/checkpoint.json says it's done "
+        f"({', '.join(STAGES)}; repeatable). Later stages rerun only where their inputs changed",
+    )
     args = parser.parse_args()
+    llm.set_response_cache(not args.no_llm_cache)
+    llm.set_concurrency(args.llm_concurrency)
+    set_upload_limit(args.upload_concurrency)
 
     # Iteration mode
     if args.iterate:
         if not args.feedback:
             print("Error: --feedback required when using --iterate")
             return
-        iterate_on_clip(args.episode_name, args.iterate, args.feedback)
+        if len(args.episode_names) != 1:
+            parser.error("--iterate needs exactly one episode")
+        iterate_on_clip(args.episode_names[0], args.iterate, args.feedback, args.render_mode, args.preview_only)
+        print(llm.format_stats())
         return
 
-    # Normal clip generation mode
-    episode_dir = Path("episodes") / args.episode_name
-    clips_dir = episode_dir / "clips"
-    clips_dir.mkdir(parents=True, exist_ok=True)
+    if args.render:
+        if len(args.episode_names) != 1:
+            parser.error("--render needs exactly one episode")
+        render_saved_clip(args.episode_names[0], args.render, args.render_mode)
+        return
 
-    video_path = episode_dir / "video.mp4"
-    transcript_data = transcribe(episode_dir)
+    # Normal clip generation mode
+    episode_names = resolve_episodes(args.episode_names, args.all)
+    if not episode_names:
+        parser.error("no episodes given (name episodes, use a glob, or pass --all)")
+
+    if args.export:
+        failed = 0
+        for episode_name in episode_names:
+            print(f"Exporting {episode_name}")
+            _, episode_failed = export_approved(
+                episode_name, args.formats or list(EXPORT_FORMATS), args.captions, args.export_workers
+            )
+            failed += episode_failed
+        if failed:
+            sys.exit(f"{failed} clip exports failed")
+        return
 
-    clip_suggestions = suggest_clips(transcript_data)
+    with ProcessPoolExecutor(max_workers=args.render_workers) as render_pool:
+        if len(episode_names) == 1:
+            total, failed = process_episode(episode_names[0], args, render_pool)
+            print(llm.format_stats())
+            if failed:
+                sys.exit(f"{failed} of {total} clips failed")
+            return
 
-    for idx, suggestion in enumerate(clip_suggestions, 1):
-        process_clip(
-            suggestion, transcript_data, video_path, clips_dir, idx, len(clip_suggestions)
+        results = run_batch(
+            episode_names, lambda name: process_episode(name, args, render_pool),
+            args.parallel_episodes,
         )
+    print(format_report(results))
+    print(llm.format_stats())
+    if args.report:
+        save_report(results, args.report)
+    if any(r["status"] != "ok" for r in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,531 @@
+import fcntl
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import ffmpeg
+
+import tracing
+from envelope import load_envelope
+from keyframes import load_keyframe_index, plan_cut
+
+VIDEO_CODEC = "libx264"
+AUDIO_CODEC = "aac"
+CROP = ("min(iw,ih)", "min(iw,ih)")
+
+RENDER_MODES = ["cached", "graph", "segments", "smart"]
+
+SEGMENT_CACHE_VERSION = 1
+DEFAULT_CACHE_BYTES = 4 * 1024**3
+FINGERPRINT_BYTES = 1024**2  # bytes hashed from each end of the source video
+
+OUTPUT_FLAGS = {"movflags": "+faststart"}  # moov atom up front so playback starts before the download ends
+POSTER_WIDTH = 480
+SPRITE_WIDTH = 120
+SPRITE_INTERVAL_S = 2
+SPRITE_COLUMNS = 10
+
+# Unrendered clips are previewed from a small square-cropped copy of the episode
+PROXY_VERSION = 1
+PROXY_WIDTH = 360
+PROXY_VIDEO = {
+    "vcodec": VIDEO_CODEC, "preset": "veryfast", "crf": 30, "pix_fmt": "yuv420p",
+    "acodec": AUDIO_CODEC, "audio_bitrate": "96k",
+}
+
+# Smart-cut renders stream-copy from a square-cropped, video-only copy of the
+# episode. Only frames before a segment's first keyframe are encoded again, with
+# these same settings so the pieces can be joined without re-encoding. No
+# B-frames, so a copied run can end on any frame.
+MEZZANINE_VERSION = 1
+MEZZANINE_KEYFRAME_S = 2
+MEZZANINE_VIDEO = {
+    "vcodec": VIDEO_CODEC, "preset": "faster", "crf": 20, "bf": 0, "pix_fmt": "yuv420p", "fps_mode": "cfr",
+}
+
+
+def segment_output(video_path, start_ms, duration_ms, output_path):
+    """Build the ffmpeg output node for a single square-cropped segment."""
+    input_stream = ffmpeg.input(str(video_path), ss=start_ms / 1000, t=duration_ms / 1000)
+    video = input_stream.video.filter("crop", *CROP)
+    audio = input_stream.audio
+    return ffmpeg.output(video, audio, str(output_path), vcodec=VIDEO_CODEC, acodec=AUDIO_CODEC)
+
+
+def extract_segment(video_path, start_ms, duration_ms, output_path):
+    """Extract a single segment with square crop."""
+    (
+        segment_output(video_path, start_ms, duration_ms, output_path)
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+
+
+def concat_files(files, output_path):
+    """Stream-copy already-encoded segments into one file with the concat demuxer."""
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", dir=output_path.parent, delete=False
+    ) as f:
+        for path in files:
+            f.write(f"file '{Path(path).resolve()}'\n")
+        concat_file = Path(f.name)
+
+    try:
+        (
+            ffmpeg.input(str(concat_file), format="concat", safe=0)
+            .output(str(output_path), c="copy", **OUTPUT_FLAGS)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+    finally:
+        concat_file.unlink()
+
+
+def render_clip_segments(video_path, timestamps, output_path):
+    """Render clip by encoding each segment separately and concatenating them."""
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as temp_dir:
+        temp_dir = Path(temp_dir)
+
+        temp_files = []
+        for idx, ts in enumerate(timestamps):
+            temp_file = temp_dir / f"seg_{idx}.mp4"
+            with tracing.span("encode", start_ms=ts["start_ms"], duration_ms=ts["duration_ms"]):
+                extract_segment(video_path, ts["start_ms"], ts["duration_ms"], temp_file)
+            temp_files.append(temp_file)
+
+        with tracing.span("concat", segments=len(temp_files)):
+            concat_files(temp_files, output_path)
+
+
+@lru_cache(maxsize=64)
+def _fingerprint(path, size, mtime_ns):
+    digest = hashlib.sha256(f"{size}:{mtime_ns}".encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        f.seek(max(0, size - FINGERPRINT_BYTES))
+        digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def source_fingerprint(video_path):
+    """Identify a source video by size, mtime and a hash of its first and last MiB."""
+    stat = os.stat(video_path)
+    return _fingerprint(str(video_path), stat.st_size, stat.st_mtime_ns)
+
+
+class SegmentCache:
+    """Size-bounded LRU cache of encoded segments.
+
+    Entries are keyed by the source video fingerprint, the segment's
+    start/end and the crop and encoder settings, so an identical segment is
+    only ever encoded once. Hits refresh the entry's mtime; eviction removes
+    the least recently used entries once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, video_path, ts):
+        settings = {
+            "version": SEGMENT_CACHE_VERSION,
+            "source": source_fingerprint(video_path),
+            "start_ms": ts["start_ms"],
+            "end_ms": ts["start_ms"] + ts["duration_ms"],
+            "crop": CROP,
+            "vcodec": VIDEO_CODEC,
+            "acodec": AUDIO_CODEC,
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key):
+        return self.cache_dir / f"{key}.mp4"
+
+    def get(self, key):
+        """Return the cached segment for key, or None on a miss."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, encoded_path):
+        """Move a freshly encoded segment into the cache."""
+        os.replace(encoded_path, self.path(key))
+        return self.path(key)
+
+    def evict(self, keep=()):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob("*.mp4"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        keep = {Path(p) for p in keep}
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def episode_segment_cache(video_path):
+    """The segment cache for an episode, under episodes/<name>/.cache."""
+    return SegmentCache(Path(video_path).parent / ".cache" / "segments")
+
+
+def render_clip_cached(video_path, timestamps, output_path, cache):
+    """Render clip, encoding only segments missing from the cache.
+
+    All misses are encoded by a single ffmpeg invocation, then the cached
+    pieces are stream-copied into the clip.
+    """
+    keys = [cache.key(video_path, ts) for ts in timestamps]
+
+    misses = {}
+    for key, ts in zip(keys, timestamps):
+        if key not in misses and cache.get(key) is None:
+            misses[key] = ts
+    tracing.event("segment_cache", hits=len(keys) - len(misses), misses=len(misses))
+
+    if misses:
+        print(f"Encoding {len(misses)} of {len(keys)} segments for {output_path.name}")
+        with tempfile.TemporaryDirectory(dir=cache.cache_dir) as temp_dir:
+            encoded = {key: Path(temp_dir) / f"{key}.mp4" for key in misses}
+            outputs = [
+                segment_output(video_path, ts["start_ms"], ts["duration_ms"], encoded[key])
+                for key, ts in misses.items()
+            ]
+            with tracing.span("encode", segments=len(misses)):
+                (
+                    ffmpeg.merge_outputs(*outputs)
+                    .overwrite_output()
+                    .run(capture_stdout=True, capture_stderr=True)
+                )
+            for key, path in encoded.items():
+                cache.put(key, path)
+
+    segment_files = [cache.path(key) for key in keys]
+    with tracing.span("concat", segments=len(segment_files)):
+        concat_files(segment_files, output_path)
+    cache.evict(keep=segment_files)
+
+
+def mezzanine_paths(video_path):
+    """The episode's smart-cut mezzanine and its keyframe index, under episodes/<name>/.cache."""
+    cache_dir = Path(video_path).parent / ".cache"
+    return cache_dir / "mezzanine.mp4", cache_dir / "mezzanine_keyframes.json"
+
+
+def build_once(output_path, settings, build):
+    """Run build(temp_path) to create output_path, unless it was already built with these settings.
+
+    Render workers may ask for the same file at the same time, so this holds
+    a file lock and only the first one builds it.
+    """
+    output_path = Path(output_path)
+    settings_path = output_path.with_suffix(".json")
+    settings = json.loads(json.dumps(settings))
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(output_path.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(settings_path, "r", encoding="utf-8") as f:
+                current = json.load(f) == settings and output_path.exists()
+        except FileNotFoundError:
+            current = False
+
+        if not current:
+            temp_path = output_path.with_name(f"{output_path.stem}.tmp{output_path.suffix}")
+            build(temp_path)
+            os.replace(temp_path, output_path)
+            with open(settings_path, "w", encoding="utf-8") as f:
+                json.dump(settings, f, indent=2)
+    return output_path
+
+
+def ensure_mezzanine(video_path):
+    """Build the episode's mezzanine unless an up-to-date one exists. Returns (path, keyframe index)."""
+    mezzanine_path, index_path = mezzanine_paths(video_path)
+    settings = {
+        "version": MEZZANINE_VERSION,
+        "source": source_fingerprint(video_path),
+        "crop": CROP,
+        "video": MEZZANINE_VIDEO,
+        "keyframe_s": MEZZANINE_KEYFRAME_S,
+    }
+
+    def build(temp_path):
+        print(f"Building smart-cut mezzanine for {video_path}")
+        with tracing.span("mezzanine"):
+            (
+                ffmpeg.input(str(video_path))
+                .video.filter("crop", *CROP)
+                .output(
+                    str(temp_path), **MEZZANINE_VIDEO,
+                    force_key_frames=f"expr:gte(t,n_forced*{MEZZANINE_KEYFRAME_S})",
+                )
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+
+    build_once(mezzanine_path, settings, build)
+    with tracing.span("keyframe_index"):
+        index = load_keyframe_index(mezzanine_path, index_path)
+    return mezzanine_path, index
+
+
+def proxy_path(video_path):
+    """The episode's low-res preview proxy, under episodes/<name>/.cache."""
+    return Path(video_path).parent / ".cache" / "proxy.mp4"
+
+
+def ensure_proxy(video_path):
+    """Build the episode's preview proxy unless an up-to-date one exists.
+
+    It is square-cropped like the clips but small, with a keyframe every
+    second, so the review page can play any stretch of it instantly.
+    """
+    settings = {
+        "version": PROXY_VERSION,
+        "source": source_fingerprint(video_path),
+        "crop": CROP,
+        "width": PROXY_WIDTH,
+        "video": PROXY_VIDEO,
+    }
+
+    def build(temp_path):
+        print(f"Building preview proxy for {video_path}")
+        source = ffmpeg.input(str(video_path))
+        video = source.video.filter("crop", *CROP).filter("scale", PROXY_WIDTH, -2)
+        with tracing.span("proxy"):
+            (
+                ffmpeg.output(
+                    video, source.audio, str(temp_path), **PROXY_VIDEO, **OUTPUT_FLAGS,
+                    force_key_frames="expr:gte(t,n_forced*1)",
+                )
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+
+    return build_once(proxy_path(video_path), settings, build)
+
+
+def render_clip_smart(video_path, timestamps, output_path):
+    """Render clip mostly by stream copy from the episode's mezzanine.
+
+    Each segment's frames up to its first keyframe are encoded; the rest is
+    copied straight out of the mezzanine with the concat demuxer's in/out
+    points. Both sides are cut on the same frame numbers from plan_cut, so
+    the copied run starts with the frame right after the head's last one.
+    Audio is always encoded from the source, in one filter graph.
+    """
+    mezzanine_path, index = ensure_mezzanine(video_path)
+
+    with tempfile.TemporaryDirectory(dir=output_path.parent) as temp_dir:
+        temp_dir = Path(temp_dir)
+        entries = []  # concat demuxer entries: (file, inpoint, outpoint) or (head file, frames)
+        heads = []
+        segment_seconds = []
+        copied_frames = 0
+        fps = index["frame_rate"]
+        for idx, ts in enumerate(timestamps):
+            first, split, end = plan_cut(index, ts["start_ms"] / 1000, ts["duration_ms"] / 1000)
+            head_end = end if split is None else split
+            segment_seconds.append((end - first) / fps)
+            if head_end > first:
+                # Seek half a frame early so rounding can't skip frame `first`,
+                # and keep the frames as decoded: cfr would pad the gap before
+                # it with a duplicate and push the head's last frame out
+                head_path = temp_dir / f"head_{idx}.mp4"
+                heads.append(
+                    ffmpeg.input(str(mezzanine_path), ss=(first - 0.5) / fps)
+                    .video.filter("setpts", "PTS-STARTPTS")
+                    .output(
+                        str(head_path), **{**MEZZANINE_VIDEO, "fps_mode": "passthrough"},
+                        **{"frames:v": head_end - first},
+                    )
+                )
+                entries.append((head_path, head_end - first))
+            if split is not None:
+                entries.append((mezzanine_path, split / fps, end / fps))
+                copied_frames += end - split
+        tracing.event(
+            "smart_cut", segments=len(timestamps), encoded_heads=len(heads),
+            copied_s=round(copied_frames / fps, 3), total_s=round(sum(segment_seconds), 3),
+        )
+
+        if heads:
+            with tracing.span("encode", segments=len(heads)):
+                (
+                    ffmpeg.merge_outputs(*heads)
+                    .overwrite_output()
+                    .run(capture_stdout=True, capture_stderr=True)
+                )
+
+        concat_file = temp_dir / "concat.txt"
+        with open(concat_file, "w") as f:
+            for path, *cut in entries:
+                f.write(f"file '{Path(path).resolve()}'\n")
+                if len(cut) == 1:
+                    # A head's last packet has no duration, so the next file
+                    # would start on top of it; give its length explicitly
+                    f.write(f"duration {round(cut[0] / fps * 1e6)}us\n")
+                else:
+                    # Microseconds, rounded so the keyframe is the first packet
+                    # in and the frame at outpoint is the first one out
+                    inpoint, outpoint = cut
+                    f.write(f"inpoint {math.ceil(inpoint * 1e6)}us\noutpoint {math.floor(outpoint * 1e6)}us\n")
+
+        # Audio is cut to the same whole number of frames as the video, as the
+        # concat filter of the other modes does, so it stays in sync
+        audio_streams = [
+            ffmpeg.input(str(video_path), ss=ts["start_ms"] / 1000, t=seconds).audio
+            for ts, seconds in zip(timestamps, segment_seconds)
+        ]
+        audio = ffmpeg.concat(*audio_streams, v=0, a=1) if len(audio_streams) > 1 else audio_streams[0]
+        video = ffmpeg.input(str(concat_file), format="concat", safe=0).video
+        with tracing.span("concat", segments=len(entries)):
+            (
+                ffmpeg.output(video, audio, str(output_path), vcodec="copy", acodec=AUDIO_CODEC, **OUTPUT_FLAGS)
+                .overwrite_output()
+                .run(capture_stdout=True, capture_stderr=True)
+            )
+
+
+def clip_output(video_path, timestamps, output_path):
+    """Build the ffmpeg output node that renders one clip in a single filter graph.
+
+    Each segment is its own input with an input-side seek, so ffmpeg jumps
+    straight to it instead of decoding (and trimming away) everything before
+    it. The segments are joined with the concat filter and cropped once.
+    """
+    streams = []
+    for ts in timestamps:
+        segment = ffmpeg.input(
+            str(video_path), ss=ts["start_ms"] / 1000, t=ts["duration_ms"] / 1000
+        )
+        streams += [segment.video, segment.audio]
+
+    joined = ffmpeg.concat(*streams, v=1, a=1).node
+    video = joined[0].filter("crop", *CROP)
+    return ffmpeg.output(
+        video, joined[1], str(output_path), vcodec=VIDEO_CODEC, acodec=AUDIO_CODEC, **OUTPUT_FLAGS
+    )
+
+
+def render_clips(video_path, clips):
+    """Render several clips of the same source in one ffmpeg invocation.
+
+    clips is a list of (timestamps, output_path) pairs.
+    """
+    clips = [(timestamps, output_path) for timestamps, output_path in clips if timestamps]
+    if not clips:
+        return
+    outputs = [clip_output(video_path, timestamps, path) for timestamps, path in clips]
+    with tracing.span("encode", clips=len(clips), segments=sum(len(t) for t, _ in clips)):
+        (
+            ffmpeg.merge_outputs(*outputs)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+
+
+def preview_paths(clip_path):
+    """Poster and thumbnail sprite paths for a clip, next to its mp4."""
+    clip_path = Path(clip_path)
+    return (
+        clip_path.with_name(f"{clip_path.stem}_poster.jpg"),
+        clip_path.with_name(f"{clip_path.stem}_sprite.jpg"),
+    )
+
+
+def sprite_layout(duration_ms):
+    """(frames, columns, rows) of the thumbnail sprite for a clip of this length."""
+    frames = max(1, math.ceil(duration_ms / 1000 / SPRITE_INTERVAL_S))
+    columns = min(frames, SPRITE_COLUMNS)
+    return frames, columns, math.ceil(frames / columns)
+
+
+def render_previews(clip_path, duration_ms):
+    """Write a poster frame and a thumbnail sprite for a rendered clip in one ffmpeg run.
+
+    The poster is taken a second in (or halfway through very short clips);
+    the sprite tiles one frame every SPRITE_INTERVAL_S seconds.
+    """
+    poster_path, sprite_path = preview_paths(clip_path)
+    _, columns, rows = sprite_layout(duration_ms)
+    poster_at = min(1, duration_ms / 2000)
+
+    video = ffmpeg.input(str(clip_path)).video.split()
+    poster = video[0].trim(start=poster_at).filter("scale", POSTER_WIDTH, -2)
+    sprite = (
+        video[1]
+        .filter("fps", 1 / SPRITE_INTERVAL_S)
+        .filter("scale", SPRITE_WIDTH, -2)
+        .filter("tile", f"{columns}x{rows}")
+    )
+    (
+        ffmpeg.merge_outputs(
+            ffmpeg.output(poster, str(poster_path), vframes=1, update=1),
+            ffmpeg.output(sprite, str(sprite_path), vframes=1, update=1),
+        )
+        .overwrite_output()
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+
+
+def snap_to_gaps(video_path, timestamps):
+    """Timestamps with boundaries moved to nearby pauses, if the episode has an envelope."""
+    envelope = load_envelope(Path(video_path).parent)
+    if envelope is None:
+        return timestamps
+    snapped = envelope.snap(timestamps)
+    moved = sum(
+        (a["start_ms"] != b["start_ms"]) + (a["end_ms"] != b["end_ms"])
+        for a, b in zip(timestamps, snapped)
+    )
+    tracing.event("snap", boundaries=2 * len(timestamps), moved=moved)
+    return snapped
+
+
+def render_clip(video_path, timestamps, output_path, mode="cached"):
+    """Render clip from timestamps, plus its poster and thumbnail sprite.
+
+    Segment boundaries are first snapped to pauses in the episode's audio
+    envelope, so cuts don't land mid-word or mid-breath.
+    """
+    if not timestamps:
+        print(f"WARNING: No segments to render for {output_path.name}")
+        return
+
+    timestamps = snap_to_gaps(video_path, timestamps)
+
+    with tracing.span("render_clip", clip=output_path.name, mode=mode, segments=len(timestamps)):
+        if mode == "cached":
+            render_clip_cached(video_path, timestamps, output_path, episode_segment_cache(video_path))
+        elif mode == "segments":
+            render_clip_segments(video_path, timestamps, output_path)
+        elif mode == "smart" and shutil.which("ffprobe"):
+            render_clip_smart(video_path, timestamps, output_path)
+        elif mode == "smart":
+            print("WARNING: ffprobe not found, smart-cut falls back to encoding every segment")
+            render_clip_cached(video_path, timestamps, output_path, episode_segment_cache(video_path))
+        else:
+            render_clips(video_path, [(timestamps, output_path)])
+        with tracing.span("previews"):
+            render_previews(output_path, sum(ts["duration_ms"] for ts in timestamps))
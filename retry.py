@@ -0,0 +1,28 @@
+import random
+import time
+
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0  # seconds; doubled after every failed attempt
+RETRY_MAX_DELAY = 60.0
+
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY):
+    """Jittered exponential backoff before retry number attempt (1-based)."""
+    return min(RETRY_MAX_DELAY, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+def wait_before_retry(what, error, attempt, attempts=RETRY_ATTEMPTS):
+    delay = backoff_delay(attempt)
+    print(f"{what} failed ({error}); retrying in {delay:.1f}s ({attempt}/{attempts - 1})")
+    time.sleep(delay)
+
+
+def with_retries(fn, is_retryable, what, attempts=RETRY_ATTEMPTS):
+    """Call fn(), retrying with backoff while is_retryable(error) says the failure is transient."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts or not is_retryable(e):
+                raise
+            wait_before_retry(what, e, attempt, attempts)
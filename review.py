@@ -1,59 +1,67 @@
 import argparse
 import json
-import subprocess
+import os
+import time
+from collections import Counter
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, flash
-from main import iterate_on_clip
+from flask import (
+    Flask, Response, abort, flash, g, jsonify, redirect, render_template, request,
+    send_from_directory, url_for,
+)
+from catalog import Catalog, update_json
+from checkpoints import Checkpoint
+from envelope import envelope_dir, load_envelope
+from export import EXPORT_FORMATS, export_dir
+from jobs import JobQueue, job_duration
+from metrics import Gauge, Histogram, render as render_metrics
+from render import proxy_path, source_fingerprint, sprite_layout
 
 app = Flask(__name__)
 app.secret_key = "podcast-producer-secret-key"  # For flash messages
 
+jobs = JobQueue(workers=2)
+catalog = Catalog()
+
+MEDIA_MAX_AGE = 365 * 24 * 3600
+MEDIA_FILES = {
+    "serve_video": "{hook}.mp4",
+    "serve_poster": "{hook}_poster.jpg",
+    "serve_sprite": "{hook}_sprite.jpg",
+}
+WAVEFORM_POINTS = 600  # peaks across the whole clip timeline
+app.add_template_global(sprite_layout)
+
+request_latency = Histogram(
+    "podcast_http_request_duration_seconds", "Review UI request latency",
+    ("endpoint", "method", "status"),
+)
+jobs_by_status = Gauge(
+    "podcast_jobs", "Background jobs currently known, by kind and status",
+    lambda: sorted(
+        ((("kind", kind), ("status", status)), count)
+        for (kind, status), count in Counter((j.kind, j.status) for j in jobs.list()).items()
+    ),
+)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    if "request_start" in g:
+        request_latency.observe(
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or "unmatched", method=request.method, status=response.status_code,
+        )
+    return response
+
 
 def get_all_episodes():
     """Get all episodes from the episodes directory."""
-    episodes_dir = Path("episodes")
-    if not episodes_dir.exists():
-        episodes_dir.mkdir(exist_ok=True)
-        return []
-    
-    episodes = []
-    for episode_dir in sorted(episodes_dir.iterdir()):
-        if episode_dir.is_dir() and not episode_dir.name.startswith('.'):
-            video_path = episode_dir / "video.mp4"
-            clips_dir = episode_dir / "clips"
-            transcript_path = episode_dir / "transcript.json"
-            
-            # Check status
-            has_video = video_path.exists()
-            has_transcript = transcript_path.exists()
-            has_clips = clips_dir.exists() and any(clips_dir.glob("*.mp4"))
-            
-            clip_count = 0
-            draft_count = 0
-            approved_count = 0
-            
-            if has_clips:
-                for metadata_file in clips_dir.glob("*_metadata.json"):
-                    clip_count += 1
-                    with open(metadata_file, 'r') as f:
-                        metadata = json.load(f)
-                        status = metadata.get('status', 'draft')
-                        if status == 'draft':
-                            draft_count += 1
-                        elif status == 'approved':
-                            approved_count += 1
-            
-            episodes.append({
-                'name': episode_dir.name,
-                'has_video': has_video,
-                'has_transcript': has_transcript,
-                'has_clips': has_clips,
-                'clip_count': clip_count,
-                'draft_count': draft_count,
-                'approved_count': approved_count,
-            })
-    
-    return episodes
+    return catalog.episodes()
 
 
 def get_clips_dir(episode_name):
@@ -68,45 +76,58 @@ def load_clip_metadata(episode_name, hook):
         return json.load(f)
 
 
-def save_clip_metadata(episode_name, hook, metadata):
-    """Save metadata for a specific clip."""
+def update_clip_metadata(episode_name, hook, update, expected_version=None):
+    """Apply update to a clip's metadata under its lock; see catalog.update_json.
+
+    Returns the saved metadata, or None if expected_version is stale.
+    """
     metadata_path = get_clips_dir(episode_name) / f"{hook}_metadata.json"
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    if not metadata_path.exists():
+        abort(404)
+    metadata = update_json(metadata_path, update, expected_version)
+    if metadata is not None:
+        catalog.update_clip(episode_name, hook, metadata)
+    return metadata
 
 
 def get_all_clips(episode_name):
     """Get all clips with their metadata."""
-    clips_dir = get_clips_dir(episode_name)
-    clips = []
-    
-    for metadata_file in sorted(clips_dir.glob("*_metadata.json")):
-        hook = metadata_file.stem.replace("_metadata", "")
-        metadata = load_clip_metadata(episode_name, hook)
-        
-        # Add status if not present
-        if "status" not in metadata:
-            metadata["status"] = "draft"
-            save_clip_metadata(episode_name, hook, metadata)
-        
-        # Get video duration
-        total_duration = sum(t["duration_ms"] for t in metadata["timestamps"]) / 1000
-        
-        clips.append({
-            "hook": hook,
-            "status": metadata["status"],
-            "duration": total_duration,
-            "num_segments": len(metadata["segment_transcripts"]),
-        })
-    
-    return clips
+    return catalog.clips(episode_name)
+
+
+def job_payload(job):
+    """Job status plus the URLs the templates need to follow it."""
+    if job.kind in ("generate", "export"):
+        redirect_url = url_for("episode_clips", episode_name=job.key[1])
+    else:
+        redirect_url = url_for("view_clip", episode_name=job.key[1], hook=job.key[2])
+    return {
+        **job.to_dict(),
+        "status_url": url_for("job_status", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+        "cancel_url": url_for("cancel_job", job_id=job.id),
+        "redirect_url": redirect_url,
+    }
+
+
+def job_response(job, fallback_url):
+    """Answer a job-creating POST: JSON for the page scripts, a redirect otherwise."""
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job_payload(job)), 202
+    flash(f"{job.description} queued", "success")
+    return redirect(fallback_url)
 
 
 @app.route("/")
 def home():
     """Home page showing all episodes."""
     episodes = get_all_episodes()
-    return render_template("home.html", episodes=episodes)
+    active_job = next((j for j in jobs.list() if j.active and j.kind == "generate"), None)
+    return render_template(
+        "home.html",
+        episodes=episodes,
+        active_job=job_payload(active_job) if active_job else None,
+    )
 
 
 @app.route("/episode/<episode_name>/clips")
@@ -115,12 +136,15 @@ def episode_clips(episode_name):
     clips = get_all_clips(episode_name)
     draft_clips = [c for c in clips if c["status"] == "draft"]
     approved_clips = [c for c in clips if c["status"] == "approved"]
+    active_job = jobs.active_job(("export", episode_name))
     
     return render_template(
         "clips.html",
         episode_name=episode_name,
         draft_clips=draft_clips,
         approved_clips=approved_clips,
+        export_formats=list(EXPORT_FORMATS),
+        active_job=job_payload(active_job) if active_job else None,
     )
 
 
@@ -135,10 +159,17 @@ def view_clip(episode_name, hook):
     prev_hook = all_clips[current_idx - 1]["hook"] if current_idx > 0 else None
     next_hook = all_clips[current_idx + 1]["hook"] if current_idx < len(all_clips) - 1 else None
     
+    active_job = jobs.active_job(("iterate", episode_name, hook))
+
+    # Drafts aren't rendered until approved; play them from the episode video
+    preview = not metadata.get("rendered", True) or not (get_clips_dir(episode_name) / f"{hook}.mp4").exists()
+
     return render_template(
         "clip.html",
         hook=hook,
+        active_job=job_payload(active_job) if active_job else None,
         metadata=metadata,
+        preview=preview,
         episode_name=episode_name,
         current=current_idx + 1,
         total=len(all_clips),
@@ -149,27 +180,43 @@ def view_clip(episode_name, hook):
 
 @app.route("/episode/<episode_name>/clip/<hook>/save", methods=["POST"])
 def save_tweet(episode_name, hook):
-    """Save edited tweet text."""
-    metadata = load_clip_metadata(episode_name, hook)
-    metadata["tweet_text"] = request.form["tweet_text"]
-    save_clip_metadata(episode_name, hook, metadata)
+    """Save edited tweet text, unless the clip changed since the page was loaded."""
+    version = request.form.get("version", type=int)
+    tweet_text = request.form["tweet_text"]
+    if update_clip_metadata(episode_name, hook, lambda m: m.update(tweet_text=tweet_text), version) is None:
+        flash("This clip was changed while you were editing it, so your text wasn't saved. "
+              "Here is the latest version.", "error")
     return redirect(url_for("view_clip", episode_name=episode_name, hook=hook))
 
 
 @app.route("/episode/<episode_name>/clip/<hook>/iterate", methods=["POST"])
 def iterate(episode_name, hook):
-    """Iterate on clip with feedback."""
+    """Queue an iteration on clip with feedback."""
     feedback = request.form["feedback"]
-    iterate_on_clip(episode_name, hook, feedback)
-    return redirect(url_for("view_clip", episode_name=episode_name, hook=hook))
+    job = jobs.submit(
+        "iterate",
+        ("iterate", episode_name, hook),
+        ["uv", "run", "main.py", episode_name, "--iterate", hook, "--feedback", feedback, "--preview-only"],
+        f"Updating {hook}",
+        on_done=lambda job: catalog.invalidate(episode_name),
+    )
+    return job_response(job, url_for("view_clip", episode_name=episode_name, hook=hook))
 
 
 @app.route("/episode/<episode_name>/clip/<hook>/approve", methods=["POST"])
 def approve(episode_name, hook):
     """Approve clip for scheduling."""
-    metadata = load_clip_metadata(episode_name, hook)
-    metadata["status"] = "approved"
-    save_clip_metadata(episode_name, hook, metadata)
+    metadata = update_clip_metadata(episode_name, hook, lambda m: m.update(status="approved"))
+
+    # The full-quality render happens only once a clip is approved
+    if not metadata.get("rendered", True):
+        jobs.submit(
+            "render",
+            ("render", episode_name, hook),
+            ["uv", "run", "main.py", episode_name, "--render", hook],
+            f"Rendering {hook}",
+            on_done=lambda job: catalog.invalidate(episode_name),
+        )
     
     # Navigate to next draft clip
     all_clips = get_all_clips(episode_name)
@@ -181,17 +228,186 @@ def approve(episode_name, hook):
         return redirect(url_for("episode_clips", episode_name=episode_name))
 
 
+def send_media(directory, filename):
+    """Send a media file with ETag/Range support.
+
+    URLs from media_url carry a ?v= version, so those responses can be cached
+    for a year; unversioned requests are revalidated with the ETag.
+    """
+    response = send_from_directory(
+        Path(directory).resolve(), filename, conditional=True, etag=True, max_age=0
+    )
+    if request.args.get("v"):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = MEDIA_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+@app.template_global()
+def media_url(endpoint, episode_name, hook):
+    """URL of a clip file, versioned by its mtime, or None if it hasn't been rendered."""
+    filename = MEDIA_FILES[endpoint].format(hook=hook)
+    try:
+        version = os.stat(get_clips_dir(episode_name) / filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return url_for(endpoint, episode_name=episode_name, hook=hook, v=version)
+
+
 @app.route("/episode/<episode_name>/video/<hook>.mp4")
 def serve_video(episode_name, hook):
     """Serve video files."""
-    from flask import send_from_directory
-    clips_dir = get_clips_dir(episode_name)
-    return send_from_directory(clips_dir, f"{hook}.mp4")
+    return send_media(get_clips_dir(episode_name), MEDIA_FILES["serve_video"].format(hook=hook))
+
+
+@app.route("/episode/<episode_name>/poster/<hook>.jpg")
+def serve_poster(episode_name, hook):
+    """Serve a clip's poster frame."""
+    return send_media(get_clips_dir(episode_name), MEDIA_FILES["serve_poster"].format(hook=hook))
+
+
+@app.route("/episode/<episode_name>/sprite/<hook>.jpg")
+def serve_sprite(episode_name, hook):
+    """Serve a clip's thumbnail sprite."""
+    return send_media(get_clips_dir(episode_name), MEDIA_FILES["serve_sprite"].format(hook=hook))
+
+
+def preview_source(episode_name):
+    """(path, cropped) of the video unrendered clips are previewed from.
+
+    The episode's proxy if it was built from the current video.mp4,
+    otherwise video.mp4 itself, cropped by the browser.
+    """
+    video_path = Path("episodes") / episode_name / "video.mp4"
+    proxy = proxy_path(video_path)
+    try:
+        with open(proxy.with_suffix(".json"), "r", encoding="utf-8") as f:
+            current = json.load(f).get("source") == source_fingerprint(video_path) and proxy.exists()
+    except FileNotFoundError:
+        current = False
+    return (proxy, True) if current else (video_path, False)
+
+
+@app.route("/episode/<episode_name>/preview/<filename>")
+def serve_preview_source(episode_name, filename):
+    """Serve the preview source video, with Range support so the player can seek into it."""
+    path, _ = preview_source(episode_name)
+    if path.name != filename:
+        abort(404)
+    return send_media(path.parent, path.name)
+
+
+@app.template_global()
+def export_urls(episode_name, hook):
+    """(name, versioned URL) of each exported file of a clip."""
+    urls = []
+    for path in sorted(export_dir(Path("episodes") / episode_name, hook).glob("*.mp4")):
+        if not path.stem.endswith(".tmp"):
+            urls.append((path.stem, url_for(
+                "serve_export", episode_name=episode_name, hook=hook, filename=path.name, v=path.stat().st_mtime_ns
+            )))
+    return urls
+
+
+@app.route("/episode/<episode_name>/export/<hook>/<filename>")
+def serve_export(episode_name, hook, filename):
+    """Serve an exported clip file."""
+    return send_media(export_dir(Path("episodes") / episode_name, hook), filename)
+
+
+@app.route("/episode/<episode_name>/export", methods=["POST"])
+def export_clips(episode_name):
+    """Queue exporting every approved clip to the chosen formats."""
+    command = ["uv", "run", "main.py", episode_name, "--export"]
+    for format_name in request.form.getlist("format"):
+        if format_name in EXPORT_FORMATS:
+            command += ["--format", format_name]
+    if request.form.get("captions"):
+        command.append("--captions")
+
+    job = jobs.submit(
+        "export",
+        ("export", episode_name),
+        command,
+        f"Exporting approved clips of {episode_name}",
+    )
+    return job_response(job, url_for("episode_clips", episode_name=episode_name))
+
+
+_envelopes = {}  # episode name -> (meta.json mtime, Envelope)
+
+
+def get_envelope(episode_name):
+    """The episode's memory-mapped audio envelope, reopened only when it's rebuilt."""
+    episode_dir = Path("episodes") / episode_name
+    try:
+        version = os.stat(envelope_dir(episode_dir) / "meta.json").st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _envelopes.get(episode_name)
+    if cached is None or cached[0] != version:
+        cached = _envelopes[episode_name] = (version, load_envelope(episode_dir))
+    return cached[1]
+
+
+@app.route("/episode/<episode_name>/clip/<hook>/playlist.json")
+def clip_playlist(episode_name, hook):
+    """The source ranges an unrendered clip is played from, cut where render_clip would cut them."""
+    timestamps = load_clip_metadata(episode_name, hook).get("timestamps") or []
+    envelope = get_envelope(episode_name)
+    if envelope is not None:
+        timestamps = envelope.snap(timestamps)
+    path, cropped = preview_source(episode_name)
+    version = os.stat(path).st_mtime_ns
+    response = jsonify({
+        "src": url_for("serve_preview_source", episode_name=episode_name, filename=path.name, v=version),
+        "cropped": cropped,
+        "segments": [
+            {"start_ms": ts["start_ms"], "end_ms": ts["start_ms"] + ts["duration_ms"]} for ts in timestamps
+        ],
+    })
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route("/episode/<episode_name>/clip/<hook>/waveform.json")
+def clip_waveform(episode_name, hook):
+    """Waveform of a clip's segments, read from the precomputed envelope.
+
+    Segments are laid end to end as in the rendered clip; each lists its
+    word-aligned and snapped boundaries and its share of the peaks.
+    """
+    envelope = get_envelope(episode_name)
+    if envelope is None:
+        abort(404)
+    timestamps = load_clip_metadata(episode_name, hook).get("timestamps") or []
+    snapped = envelope.snap(timestamps)
+    total_ms = sum(ts["duration_ms"] for ts in snapped) or 1
+
+    segments = []
+    offset_ms = 0
+    for ts, snap in zip(timestamps, snapped):
+        points = max(1, round(WAVEFORM_POINTS * snap["duration_ms"] / total_ms))
+        segments.append({
+            "offset_ms": offset_ms,
+            "start_ms": snap["start_ms"],
+            "end_ms": snap["end_ms"],
+            "word_start_ms": ts["start_ms"],
+            "word_end_ms": ts["start_ms"] + ts["duration_ms"],
+            "peaks": envelope.peaks(snap["start_ms"], snap["end_ms"], points),
+        })
+        offset_ms += snap["duration_ms"]
+
+    response = jsonify({"duration_ms": offset_ms, "segments": segments})
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @app.route("/episode/<episode_name>/generate", methods=["POST"])
 def generate_clips(episode_name):
-    """Generate clips for an episode."""
+    """Queue clip generation for an episode."""
     episode_dir = Path("episodes") / episode_name
     video_path = episode_dir / "video.mp4"
     
@@ -199,31 +415,85 @@ def generate_clips(episode_name):
         flash(f"Error: video.mp4 not found in episodes/{episode_name}/", "error")
         return redirect(url_for("home"))
     
-    try:
-        # Run main.py to generate clips
-        result = subprocess.run(
-            ["uv", "run", "main.py", episode_name],
-            capture_output=True,
-            text=True,
-            timeout=1800  # 30 minute timeout
-        )
-        
-        if result.returncode == 0:
-            flash(f"Successfully generated clips for {episode_name}!", "success")
-        else:
-            flash(f"Error generating clips: {result.stderr}", "error")
-    except subprocess.TimeoutExpired:
-        flash("Clip generation timed out (30 minutes)", "error")
-    except Exception as e:
-        flash(f"Error: {str(e)}", "error")
-    
-    return redirect(url_for("episode_clips", episode_name=episode_name))
+    # Clips are previewed until approved, and only then rendered
+    command = ["uv", "run", "main.py", episode_name, "--preview-only"]
+    checkpoint_path = episode_dir / "checkpoint.json"
+    clips_dir = episode_dir / "clips"
+    if checkpoint_path.exists():
+        finished = Checkpoint(checkpoint_path).finished()
+    else:
+        finished = clips_dir.exists() and any(clips_dir.glob("*_metadata.json"))
+    if finished:
+        # Regenerating should ask Claude for new clips, not replay cached answers.
+        # An interrupted run is resumed instead.
+        command += ["--force", "suggest", "--no-llm-cache"]
+
+    job = jobs.submit(
+        "generate",
+        ("generate", episode_name),
+        command,
+        f"Generating clips for {episode_name}",
+        on_done=lambda job: catalog.invalidate(episode_name),
+    )
+    return job_response(job, url_for("home"))
+
+
+@app.route("/jobs")
+def list_jobs():
+    """All recent jobs, newest first."""
+    return jsonify([job_payload(job) for job in jobs.list()])
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Current status of a job."""
+    job = jobs.get(job_id) or abort(404)
+    return jsonify(job_payload(job))
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-sent events with the job's status every time it changes."""
+    job = jobs.get(job_id) or abort(404)
+    payload = job_payload(job)
+
+    def stream():
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield f"data: {json.dumps({**payload, **job.to_dict()})}\n\n"
+                if not job.active:
+                    return
+            elif jobs.wait_for_change(job, version) == version:
+                yield ": keepalive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    job = jobs.cancel(job_id) or abort(404)
+    return jsonify(job_payload(job))
+
+
+@app.route("/metrics")
+def metrics():
+    """Request latencies and job durations in the Prometheus text format."""
+    return Response(
+        render_metrics([request_latency, job_duration, jobs_by_status]),
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
     parser.add_argument("--port", type=int, default=5000, help="Port to run on")
+    parser.add_argument("--debug", action="store_true", help="Reload on code changes and show tracebacks")
     args = parser.parse_args()
+    catalog.build()
     
     print(f"\n{'='*60}")
     print("Podcast Clip Producer")
@@ -231,7 +501,7 @@ def main():
     print(f"\nOpen: http://localhost:{args.port}")
     print("Press Ctrl+C to quit\n")
     
-    app.run(debug=True, port=args.port)
+    app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
 
 
 if __name__ == "__main__":
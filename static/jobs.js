@@ -0,0 +1,89 @@
+// Background jobs: submit a form without blocking the page, then follow the
+// job's progress in the loading overlay until it finishes.
+
+let currentJob = null;
+
+function showJobOverlay(message) {
+    document.getElementById('loading-overlay').style.display = 'flex';
+    document.getElementById('job-error').style.display = 'none';
+    document.getElementById('job-cancel').style.display = 'inline-block';
+    setJobProgress(message || 'Queued');
+}
+
+function hideJobOverlay() {
+    document.getElementById('loading-overlay').style.display = 'none';
+    currentJob = null;
+}
+
+function setJobProgress(message) {
+    document.getElementById('job-progress').textContent = message;
+}
+
+function showJobError(message) {
+    const error = document.getElementById('job-error');
+    error.textContent = message;
+    error.style.display = 'block';
+    document.getElementById('job-cancel').style.display = 'none';
+    document.getElementById('job-close').style.display = 'inline-block';
+}
+
+function submitJob(event, form) {
+    event.preventDefault();
+    showJobOverlay('Queued');
+    fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: { 'Accept': 'application/json' },
+    })
+        .then(response => response.json())
+        .then(watchJob)
+        .catch(err => showJobError(err.message));
+    return false;
+}
+
+function handleJobUpdate(job) {
+    setJobProgress(job.progress);
+    if (job.status === 'done') {
+        window.location.href = currentJob.redirect_url;
+    } else if (job.status === 'failed') {
+        showJobError(job.output || job.progress);
+    } else if (job.status === 'cancelled') {
+        hideJobOverlay();
+    }
+    return ['queued', 'running', 'cancelling'].includes(job.status);
+}
+
+function pollJob() {
+    if (!currentJob) return;
+    fetch(currentJob.status_url, { headers: { 'Accept': 'application/json' } })
+        .then(response => response.json())
+        .then(job => {
+            if (handleJobUpdate(job)) setTimeout(pollJob, 2000);
+        })
+        .catch(() => setTimeout(pollJob, 5000));
+}
+
+function watchJob(job) {
+    currentJob = job;
+    showJobOverlay(job.progress);
+    if (!handleJobUpdate(job)) return;
+
+    if (!window.EventSource) {
+        pollJob();
+        return;
+    }
+    const source = new EventSource(job.events_url);
+    source.onmessage = event => {
+        if (!handleJobUpdate(JSON.parse(event.data))) source.close();
+    };
+    source.onerror = () => {
+        source.close();
+        pollJob();
+    };
+}
+
+function cancelJob() {
+    if (!currentJob) return;
+    setJobProgress('Cancelling...');
+    fetch(currentJob.cancel_url, { method: 'POST', headers: { 'Accept': 'application/json' } });
+}
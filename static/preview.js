@@ -0,0 +1,70 @@
+// Draft preview: play an unrendered clip's segments one after another straight
+// from the episode video (or its proxy). VirtualClip gives the <video> the
+// clip's own timeline, so the waveform can drive it like a rendered clip.
+
+class VirtualClip {
+    constructor(video, playlist) {
+        this.video = video;
+        this.segments = [];
+        let offset = 0;
+        playlist.segments.forEach(segment => {
+            const start = segment.start_ms / 1000;
+            const end = segment.end_ms / 1000;
+            this.segments.push({start, end, offset});
+            offset += end - start;
+        });
+        this.duration = offset;
+        this.index = 0;
+        this.listeners = {};
+
+        if (!playlist.cropped) video.classList.add('crop-square');
+        video.addEventListener('loadedmetadata', () => {
+            this.currentTime = 0;
+            video.play().catch(() => {});
+        }, {once: true});
+        video.addEventListener('play', () => requestAnimationFrame(() => this.tick()));
+        video.addEventListener('seeked', () => this.emit('seeked'));
+        video.addEventListener('click', () => video.paused ? video.play() : video.pause());
+        video.src = playlist.src;
+    }
+
+    get currentTime() {
+        const segment = this.segments[this.index];
+        if (!segment) return 0;
+        const time = Math.min(Math.max(this.video.currentTime, segment.start), segment.end);
+        return segment.offset + time - segment.start;
+    }
+
+    set currentTime(time) {
+        if (!this.segments.length) return;
+        time = Math.min(Math.max(time, 0), this.duration);
+        const idx = this.segments.findIndex(s => time < s.offset + s.end - s.start);
+        this.index = idx < 0 ? this.segments.length - 1 : idx;
+        const segment = this.segments[this.index];
+        this.video.currentTime = segment.start + time - segment.offset;
+    }
+
+    // Jump to the next segment at the end of each one, and loop like the rendered clip
+    tick() {
+        if (this.video.paused || !this.segments.length) return;
+        const segment = this.segments[this.index];
+        if (this.video.currentTime >= segment.end) {
+            if (this.index + 1 < this.segments.length) {
+                this.index += 1;
+                this.video.currentTime = this.segments[this.index].start;
+            } else {
+                this.currentTime = 0;
+            }
+        }
+        this.emit('timeupdate');
+        requestAnimationFrame(() => this.tick());
+    }
+
+    addEventListener(name, listener) {
+        (this.listeners[name] = this.listeners[name] || []).push(listener);
+    }
+
+    emit(name) {
+        (this.listeners[name] || []).forEach(listener => listener());
+    }
+}
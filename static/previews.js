@@ -0,0 +1,25 @@
+// Clip list thumbnails: show the poster, and scrub through the thumbnail
+// sprite while the mouse moves across it.
+
+document.querySelectorAll('.clip-thumb[data-sprite]').forEach(thumb => {
+    if (!thumb.dataset.sprite) return;
+    const frames = Number(thumb.dataset.frames);
+    const columns = Number(thumb.dataset.columns);
+    const rows = Number(thumb.dataset.rows);
+
+    thumb.addEventListener('mousemove', event => {
+        const rect = thumb.getBoundingClientRect();
+        const frame = Math.min(frames - 1, Math.floor((event.clientX - rect.left) / rect.width * frames));
+        const column = frame % columns;
+        const row = Math.floor(frame / columns);
+        thumb.style.backgroundImage = `url('${thumb.dataset.sprite}')`;
+        thumb.style.backgroundSize = `${columns * 100}% ${rows * 100}%`;
+        thumb.style.backgroundPosition = `${columns > 1 ? column / (columns - 1) * 100 : 0}% ${rows > 1 ? row / (rows - 1) * 100 : 0}%`;
+    });
+
+    thumb.addEventListener('mouseleave', () => {
+        thumb.style.backgroundImage = `url('${thumb.dataset.poster}')`;
+        thumb.style.backgroundSize = '';
+        thumb.style.backgroundPosition = '';
+    });
+});
@@ -0,0 +1,53 @@
+// Clip timeline: draw the precomputed audio envelope of each segment, keep a
+// playhead in sync with the video and seek on click.
+
+function initWaveform(canvas, video) {
+    const context = canvas.getContext('2d');
+    let waveform = null;
+
+    function draw() {
+        const width = canvas.width = canvas.clientWidth * devicePixelRatio;
+        const height = canvas.height = canvas.clientHeight * devicePixelRatio;
+        context.clearRect(0, 0, width, height);
+        if (!waveform || !waveform.duration_ms) return;
+
+        const scale = width / waveform.duration_ms;
+        waveform.segments.forEach((segment, idx) => {
+            const left = segment.offset_ms * scale;
+            const segmentWidth = (segment.end_ms - segment.start_ms) * scale;
+            const barWidth = segmentWidth / segment.peaks.length;
+            context.fillStyle = idx % 2 ? '#7a9cc6' : '#4a6fa5';
+            segment.peaks.forEach((peak, i) => {
+                const barHeight = Math.max(1, peak * height);
+                context.fillRect(left + i * barWidth, (height - barHeight) / 2, Math.max(1, barWidth - 0.5), barHeight);
+            });
+            if (idx > 0) {
+                context.fillStyle = '#e74c3c';
+                context.fillRect(left - 1, 0, 2, height);
+            }
+        });
+
+        context.fillStyle = '#222';
+        context.fillRect(video.currentTime * 1000 * scale - 1, 0, 2, height);
+    }
+
+    fetch(canvas.dataset.src)
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data) {
+                canvas.style.display = 'none';
+                return;
+            }
+            waveform = data;
+            draw();
+        });
+
+    canvas.addEventListener('click', event => {
+        if (!waveform) return;
+        const rect = canvas.getBoundingClientRect();
+        video.currentTime = (event.clientX - rect.left) / rect.width * waveform.duration_ms / 1000;
+    });
+    video.addEventListener('timeupdate', draw);
+    video.addEventListener('seeked', draw);
+    window.addEventListener('resize', draw);
+}
@@ -0,0 +1,115 @@
+import contextvars
+import itertools
+import json
+import os
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# The run log spans are written to, and the span they nest under. Both are
+# context variables so concurrent episodes in a batch each log to their own
+# file; pass contextvars.copy_context().run to thread pools to keep them.
+_run = contextvars.ContextVar("run", default=None)
+_parent = contextvars.ContextVar("parent", default=None)
+_ids = itertools.count(1)
+
+
+class RunLog:
+    """Append-only JSON-lines log of one pipeline run.
+
+    Each record is written with a single O_APPEND write, so render worker
+    processes can log to the same file.
+    """
+
+    def __init__(self, path, run_id):
+        self.path = Path(path)
+        self.run_id = run_id
+
+    def write(self, record):
+        line = json.dumps({"run_id": self.run_id, **record}, ensure_ascii=False, default=str) + "\n"
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def run(log_dir, name, **attrs):
+    """Log every span inside this block to log_dir/<run id>.jsonl, under a top-level span."""
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    token = _run.set(RunLog(log_dir / f"{run_id}.jsonl", run_id))
+    try:
+        with span(name, **attrs) as run_attrs:
+            yield run_attrs
+    finally:
+        _run.reset(token)
+
+
+def current():
+    """(log path, run id, current span id) to hand to another process, or None outside a run."""
+    log = _run.get()
+    return (str(log.path), log.run_id, _parent.get()) if log else None
+
+
+def call_in_run(context, fn, *args, **kwargs):
+    """Call fn inside the run described by context (from current()), e.g. in a worker process."""
+    if context is None:
+        return fn(*args, **kwargs)
+    path, run_id, parent = context
+    run_token = _run.set(RunLog(path, run_id))
+    parent_token = _parent.set(parent)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _parent.reset(parent_token)
+        _run.reset(run_token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block and log it as a span.
+
+    Yields the span's attribute dict, so the block can add results such as
+    match ratios or token counts. A no-op outside a run.
+    """
+    log = _run.get()
+    if log is None:
+        yield attrs
+        return
+
+    span_id = f"{os.getpid()}-{next(_ids)}"
+    parent_id = _parent.get()
+    token = _parent.set(span_id)
+    started_at = time.time()
+    start = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        raise
+    finally:
+        _parent.reset(token)
+        log.write({
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "started_at": started_at,
+            "duration_s": round(time.perf_counter() - start, 6),
+            "status": status,
+            "error": error,
+            "attrs": attrs,
+        })
+
+
+def event(name, **attrs):
+    """Log a point-in-time record under the current span."""
+    log = _run.get()
+    if log is not None:
+        log.write({"parent_id": _parent.get(), "name": name, "at": time.time(), "attrs": attrs})
@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from catalog import file_lock
+
+STORE_VERSION = 1
+CONFIDENCE_SCALE = 10000  # confidences are stored as uint16 ten-thousandths
+
+ARRAYS = ["starts", "ends", "confidences", "word_ids", "utterance_bounds", "utterance_speakers"]
+
+
+class TranscriptStore:
+    """Columnar view of a transcript.json.
+
+    Word start/end times (ms) and confidences are packed integer arrays, word
+    texts are ids into a token table, and utterances are [first, last) word
+    offsets plus a speaker id. On disk each array is an .npy file that is only
+    memory-mapped when first used.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = Path(store_dir) if store_dir else None
+        self._arrays = {}
+        self._meta = None
+        self._tokens = None
+
+    @classmethod
+    def from_transcript_data(cls, transcript_data):
+        """Build an in-memory store from an AssemblyAI json_response."""
+        words = transcript_data["words"]
+        token_ids = {}
+        word_ids = [token_ids.setdefault(w["text"], len(token_ids)) for w in words]
+        starts = np.array([w["start"] for w in words], dtype=np.int32)
+
+        speakers = {}
+        bounds, utterance_speakers = [], []
+        for utt in transcript_data.get("utterances") or []:
+            first = int(np.searchsorted(starts, utt["start"], side="left"))
+            if "words" in utt:
+                last = first + len(utt["words"])
+            else:
+                last = int(np.searchsorted(starts, utt["end"], side="left"))
+            bounds.append((first, last))
+            utterance_speakers.append(speakers.setdefault(utt["speaker"], len(speakers)))
+
+        store = cls()
+        store._arrays = {
+            "starts": starts,
+            "ends": np.array([w["end"] for w in words], dtype=np.int32),
+            "confidences": np.array(
+                [round(w.get("confidence", 0) * CONFIDENCE_SCALE) for w in words],
+                dtype=np.uint16,
+            ),
+            "word_ids": np.array(word_ids, dtype=np.int32),
+            "utterance_bounds": np.array(bounds, dtype=np.int32).reshape(-1, 2),
+            "utterance_speakers": np.array(utterance_speakers, dtype=np.int16),
+        }
+        store._tokens = list(token_ids)
+        store._meta = {"version": STORE_VERSION, "speakers": list(speakers)}
+        return store
+
+    def save(self, store_dir, source_path=None):
+        """Write the store to store_dir, replacing any previous copy.
+
+        It is written to a temp dir of its own and swapped in under a lock, so
+        several processes may save the same store at once.
+        """
+        store_dir = Path(store_dir)
+        store_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{store_dir.name}.", dir=store_dir.parent))
+        try:
+            self._write(tmp_dir, source_path)
+            with file_lock(store_dir):
+                shutil.rmtree(store_dir, ignore_errors=True)
+                os.replace(tmp_dir, store_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _write(self, tmp_dir, source_path):
+        for name in ARRAYS:
+            np.save(tmp_dir / f"{name}.npy", self._array(name))
+        with open(tmp_dir / "tokens.json", "w", encoding="utf-8") as f:
+            json.dump(self.tokens, f, ensure_ascii=False)
+
+        meta = dict(self.meta)
+        if source_path:
+            stat = os.stat(source_path)
+            meta["source_size"] = stat.st_size
+            meta["source_mtime_ns"] = stat.st_mtime_ns
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.store_dir / f"{name}.npy", mmap_mode="r")
+        return self._arrays[name]
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(self.store_dir / "meta.json", "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    @property
+    def tokens(self):
+        """Table of distinct word texts, indexed by word_ids."""
+        if self._tokens is None:
+            with open(self.store_dir / "tokens.json", "r", encoding="utf-8") as f:
+                self._tokens = json.load(f)
+        return self._tokens
+
+    @property
+    def starts(self):
+        return self._array("starts")
+
+    @property
+    def ends(self):
+        return self._array("ends")
+
+    @property
+    def confidences(self):
+        return self._array("confidences") / CONFIDENCE_SCALE
+
+    @property
+    def word_ids(self):
+        return self._array("word_ids")
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def text(self, first, last):
+        """Text of words [first, last)."""
+        tokens = self.tokens
+        return " ".join(tokens[i] for i in self.word_ids[first:last].tolist())
+
+    def utterances(self):
+        """Yield (speaker, start_ms, end_ms, text) for each utterance."""
+        speakers = self.meta["speakers"]
+        bounds = self._array("utterance_bounds")
+        utterance_speakers = self._array("utterance_speakers")
+        for (first, last), speaker in zip(bounds.tolist(), utterance_speakers.tolist()):
+            if last <= first:
+                continue
+            yield (
+                speakers[speaker],
+                int(self.starts[first]),
+                int(self.ends[last - 1]),
+                self.text(first, last),
+            )
+
+
+def is_stale(store_dir, source_path):
+    """Whether the store is missing or was built from a different transcript.json."""
+    meta_path = Path(store_dir) / "meta.json"
+    if not meta_path.exists():
+        return True
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    stat = os.stat(source_path)
+    return (
+        meta.get("version") != STORE_VERSION
+        or meta.get("source_size") != stat.st_size
+        or meta.get("source_mtime_ns") != stat.st_mtime_ns
+    )
@@ -0,0 +1,273 @@
+import contextvars
+import json
+import os
+import shutil
+import string
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import assemblyai as aai
+import ffmpeg
+import httpx
+
+import tracing
+from retry import with_retries
+
+DEFAULT_CHUNK_SECONDS = 30 * 60
+DEFAULT_OVERLAP_SECONDS = 30
+DEFAULT_WORKERS = 4
+DEFAULT_UPLOADS = 4
+SPEAKER_MATCH_MS = 500  # max start difference for the same word in two overlapping chunks
+
+_uploads = threading.BoundedSemaphore(DEFAULT_UPLOADS)
+
+
+def set_upload_limit(limit):
+    """Cap the number of chunks being uploaded and transcribed at once, across all episodes."""
+    global _uploads
+    _uploads = threading.BoundedSemaphore(limit)
+
+
+def audio_pipe(video_path, start_s=None, duration_s=None):
+    """Start ffmpeg encoding the audio (or a slice of it) as 16 kHz mono Opus on stdout."""
+    input_kwargs = {}
+    if start_s is not None:
+        input_kwargs["ss"] = start_s
+    if duration_s is not None:
+        input_kwargs["t"] = duration_s
+    return (
+        ffmpeg.input(str(video_path), **input_kwargs)
+        .output("pipe:", format="ogg", acodec="libopus", audio_bitrate="32k", ac=1, ar=16000, vn=None)
+        .global_args("-loglevel", "error")
+        .run_async(pipe_stdout=True)
+    )
+
+
+class AssemblyAITranscriber:
+    """Uploads audio to AssemblyAI straight from a pipe."""
+
+    def __init__(self):
+        aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
+        self.config = aai.TranscriptionConfig(
+            speaker_labels=True,
+            speech_models=["slam-1"],
+        )
+
+    def transcribe(self, audio_file, start_ms, end_ms):
+        transcript = aai.Transcriber().transcribe(audio_file, config=self.config)
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+        return transcript.json_response
+
+    def is_retryable(self, error):
+        """Rate limits, server and connection errors are retried; failed transcripts are not."""
+        if isinstance(error, httpx.TransportError):
+            return True
+        status_code = getattr(error, "status_code", None)
+        return isinstance(error, aai.types.AssemblyAIError) and status_code is not None and (
+            status_code == 429 or status_code >= 500
+        )
+
+
+class ReplayTranscriber:
+    """Offline stand-in for AssemblyAI that serves words from an existing transcript.json.
+
+    The audio is still decoded and read to the end, so everything but the
+    upload is exercised.
+    """
+
+    def __init__(self, transcript_path):
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            self.words = json.load(f)["words"]
+
+    def transcribe(self, audio_file, start_ms, end_ms):
+        while audio_file.read(1 << 16):
+            pass
+        words = [
+            {**w, "start": w["start"] - start_ms, "end": w["end"] - start_ms}
+            for w in self.words
+            if start_ms <= w["start"] and (end_ms is None or w["start"] < end_ms)
+        ]
+        return {"text": " ".join(w["text"] for w in words), "words": words, "utterances": words_to_utterances(words)}
+
+    def is_retryable(self, error):
+        return False
+
+
+def get_transcriber(spec):
+    """Transcriber from a --transcriber value: 'assemblyai' or 'replay:<transcript.json>'."""
+    if spec.startswith("replay:"):
+        return ReplayTranscriber(spec.split(":", 1)[1])
+    return AssemblyAITranscriber()
+
+
+def plan_chunks(duration_s, chunk_seconds, overlap_seconds):
+    """Split [0, duration) into chunks.
+
+    Returns (keep_start, keep_end, start, end) tuples in seconds: each chunk
+    is transcribed over [start, end), which overlaps its neighbours, but
+    only contributes words that start in [keep_start, keep_end).
+    """
+    if not chunk_seconds or duration_s <= chunk_seconds + overlap_seconds:
+        return [(0, None, None, None)]
+
+    chunks = []
+    keep_start = 0
+    while keep_start < duration_s:
+        keep_end = keep_start + chunk_seconds
+        if keep_end + overlap_seconds >= duration_s:
+            keep_end = None
+        start = max(0, keep_start - overlap_seconds)
+        end = None if keep_end is None else keep_end + overlap_seconds
+        chunks.append((keep_start, keep_end, start, end))
+        if keep_end is None:
+            break
+        keep_start = keep_end
+    return chunks
+
+
+def transcribe_chunk(video_path, transcriber, start_s, end_s):
+    """Transcribe one chunk, retrying transient failures with a fresh audio pipe.
+
+    Returns the transcriber's response, with word times on the episode timeline.
+    """
+    def attempt():
+        with _uploads, tracing.span("transcribe_chunk", start_s=start_s, end_s=end_s) as attrs:
+            response = transcribe_chunk_once(video_path, transcriber, start_s, end_s)
+            attrs["words"] = len(response["words"])
+            return response
+
+    return with_retries(attempt, transcriber.is_retryable, "Transcription")
+
+
+def transcribe_chunk_once(video_path, transcriber, start_s, end_s):
+    duration_s = None if end_s is None else end_s - (start_s or 0)
+    process = audio_pipe(video_path, start_s, duration_s)
+    start_ms = round((start_s or 0) * 1000)
+    end_ms = None if end_s is None else round(end_s * 1000)
+    try:
+        response = transcriber.transcribe(process.stdout, start_ms, end_ms)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode audio from {video_path}")
+
+    for word in response["words"]:
+        word["start"] += start_ms
+        word["end"] += start_ms
+    return response
+
+
+def map_speakers(previous_words, words, used_labels):
+    """Map a chunk's speaker labels onto the labels already used before it.
+
+    Words both chunks transcribed in their overlap vote for which earlier
+    speaker each new label is. Labels without votes get fresh letters.
+    """
+    votes = Counter()
+    by_text = {}
+    for w in previous_words:
+        by_text.setdefault(w["text"].lower(), []).append(w)
+    for w in words:
+        for p in by_text.get(w["text"].lower(), ()):
+            if abs(p["start"] - w["start"]) <= SPEAKER_MATCH_MS:
+                votes[(w.get("speaker"), p.get("speaker"))] += 1
+                break
+
+    mapping = {}
+    for (label, previous_label), _ in votes.most_common():
+        if label not in mapping and previous_label not in mapping.values():
+            mapping[label] = previous_label
+
+    fresh = (c for c in string.ascii_uppercase if c not in used_labels)
+    for label in sorted({w.get("speaker") for w in words if w.get("speaker")}):
+        if label not in mapping:
+            mapping[label] = next(fresh, label)
+    return mapping
+
+
+def words_to_utterances(words):
+    """Group consecutive same-speaker words into AssemblyAI-style utterances."""
+    utterances = []
+    for word in words:
+        if utterances and utterances[-1]["speaker"] == word.get("speaker"):
+            utterances[-1]["words"].append(word)
+        else:
+            utterances.append({"speaker": word.get("speaker"), "words": [word]})
+
+    for utt in utterances:
+        utt_words = utt["words"]
+        utt["start"] = utt_words[0]["start"]
+        utt["end"] = utt_words[-1]["end"]
+        utt["text"] = " ".join(w["text"] for w in utt_words)
+        utt["confidence"] = sum(w.get("confidence", 0) for w in utt_words) / len(utt_words)
+    return utterances
+
+
+def stitch_chunks(chunks, chunk_words):
+    """Merge per-chunk words (already on the episode timeline) into one transcript.
+
+    Only the words survive; utterances are rebuilt from them.
+    """
+    words = []
+    used_labels = set()
+    previous = []
+    for (keep_start, keep_end, _, _), chunk in zip(chunks, chunk_words):
+        if previous:
+            mapping = map_speakers(previous, chunk, used_labels)
+            for w in chunk:
+                w["speaker"] = mapping.get(w.get("speaker"), w.get("speaker"))
+        used_labels.update(w.get("speaker") for w in chunk)
+
+        keep_start_ms = keep_start * 1000
+        keep_end_ms = None if keep_end is None else keep_end * 1000
+        words += [
+            w for w in chunk
+            if w["start"] >= keep_start_ms and (keep_end_ms is None or w["start"] < keep_end_ms)
+        ]
+        previous = chunk
+
+    return {
+        "text": " ".join(w["text"] for w in words),
+        "words": words,
+        "utterances": words_to_utterances(words),
+    }
+
+
+def transcribe_video(
+    video_path, transcriber,
+    chunk_seconds=DEFAULT_CHUNK_SECONDS, overlap_seconds=DEFAULT_OVERLAP_SECONDS,
+    workers=DEFAULT_WORKERS,
+):
+    """Transcribe a video without writing its audio to disk.
+
+    Audio is piped from ffmpeg as Opus straight into the transcriber. Long
+    videos are split into overlapping chunks that are transcribed
+    concurrently and stitched back together with episode-relative times and
+    consistent speaker labels. A video transcribed in one piece keeps the
+    transcriber's response as is.
+
+    Chunking needs ffprobe for the duration; without it the video is
+    transcribed in one piece.
+    """
+    if chunk_seconds and shutil.which("ffprobe"):
+        duration_s = float(ffmpeg.probe(str(video_path))["format"]["duration"])
+        chunks = plan_chunks(duration_s, chunk_seconds, overlap_seconds)
+    else:
+        if chunk_seconds:
+            print("WARNING: ffprobe not found, transcribing without chunking")
+        chunks = plan_chunks(0, 0, 0)
+
+    if len(chunks) == 1:
+        return transcribe_chunk(video_path, transcriber, None, None)
+
+    print(f"Transcribing {len(chunks)} overlapping chunks")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, transcribe_chunk, video_path, transcriber, start, end)
+            for _, _, start, end in chunks
+        ]
+        chunk_words = [future.result()["words"] for future in futures]
+    return stitch_chunks(chunks, chunk_words)
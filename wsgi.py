@@ -0,0 +1,8 @@
+# WSGI entry point for serving the review UI, e.g.
+#   gunicorn --workers 1 --threads 16 --bind 0.0.0.0:5000 wsgi:app
+#   waitress-serve --threads=16 --listen=0.0.0.0:5000 wsgi:app
+from review import app, catalog
+
+__all__ = ["app"]
+
+catalog.build()